@@ -0,0 +1,137 @@
+"""Persistent cache of packed arrays, memory-mapped when read back."""
+__author__ = "Micah Larson"
+__date__   = "$Oct 16, 2026 9:12:40 AM$"
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import struct
+
+import numpy
+
+CACHE_PATH = os.path.join('..', 'etc', 'cache') #assumes running from src
+MAGIC = 'SFCACHE1'
+ALIGNMENT = 64 #byte alignment of each array in a cache file
+ENTRY_NAME = re.compile(r'^(.*)\.[0-9a-f]{16}\.bin$') #name and key of entry
+
+def digest(path):
+    """Return the SHA-1 hex digest of the contents of the specified file."""
+    sha = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), ''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def entry(kind, name, key):
+    """Return the path of the cache entry for name (of the specified kind,
+    e.g. 'models'), keyed by a digest of its source.
+    
+    """
+    return os.path.join(CACHE_PATH, kind, '%s.%s.bin' % (name, key[:16]))
+
+def write(path, arrays, header=None):
+    """Write a dictionary of arrays (and a JSON-able header) to path, and
+    delete the entries of the same name under other keys (see prune()).
+    
+    """
+    if header is None:
+        header = {}
+    layout = []
+    offset = 0
+    for name in sorted(arrays.keys()):
+        array = numpy.ascontiguousarray(arrays[name])
+        layout.append({'name': name, 'dtype': array.dtype.str,
+                'shape': array.shape, 'offset': offset})
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    text = json.dumps({'header': header, 'arrays': layout})
+    start = -(-(len(MAGIC) + 4 + len(text)) // ALIGNMENT) * ALIGNMENT
+    
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    partial = '%s.%d.tmp' % (path, os.getpid())
+    with open(partial, 'wb') as file:
+        file.write(MAGIC + struct.pack('<I', len(text)) + text)
+        for item in layout:
+            file.seek(start + item['offset'])
+            numpy.ascontiguousarray(arrays[item['name']]).tofile(file)
+        file.truncate(start + offset)
+    os.rename(partial, path) #readers never see a partially written entry
+    prune(path)
+
+def prune(path):
+    """Delete the stale entries of the entry at path: those of the same
+    name (and kind) keyed by another digest of its source.
+    
+    """
+    (directory, base) = os.path.split(path)
+    match = ENTRY_NAME.match(base)
+    if match is None:
+        return
+    for other in os.listdir(directory):
+        stale = ENTRY_NAME.match(other)
+        if other == base or stale is None or stale.group(1) != match.group(1):
+            continue
+        try:
+            os.remove(os.path.join(directory, other))
+        except OSError:
+            pass #removed by another process, or still mapped (on Windows)
+
+def read_contents(path):
+    """Return (contents, start) of the cache entry at path, or None if there is
+    none (or it is truncated or corrupt).
+    
+    """
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            return None
+        try:
+            (length,) = struct.unpack('<I', file.read(4))
+            contents = json.loads(file.read(length))
+            start = -(-(len(MAGIC) + 4 + length) // ALIGNMENT) * ALIGNMENT
+            end = max([start] + [start + item['offset'] +
+                    numpy.dtype(str(item['dtype'])).itemsize *
+                    int(numpy.prod(item['shape'])) for item in
+                    contents['arrays']])
+        except (struct.error, ValueError, KeyError, TypeError):
+            return None
+    if 'header' not in contents or os.path.getsize(path) < end:
+        return None
+    return contents, start
+
+def read_header(path):
+    """Return the header of the cache entry at path (mapping none of its
+    arrays), or None if there is no such entry.
+    
+    """
+    contents = read_contents(path)
+    return None if contents is None else contents[0]['header']
+
+def read(path):
+    """Return (header, arrays) from the cache entry at path, memory-mapped, or
+    None if there is no such entry.
+    
+    """
+    contents = read_contents(path)
+    if contents is None:
+        return None
+    (contents, start) = contents
+    arrays = {}
+    for item in contents['arrays']:
+        shape = tuple(item['shape'])
+        if 0 in shape: #mmap can't map zero bytes
+            arrays[item['name']] = numpy.zeros(shape, item['dtype'])
+        else:
+            arrays[item['name']] = numpy.memmap(path, item['dtype'], 'r',
+                    start + item['offset'], shape)
+    return contents['header'], arrays
+
+def clear(kind=None):
+    """Delete every cache entry (or only those of the specified kind)."""
+    path = CACHE_PATH if kind is None else os.path.join(CACHE_PATH, kind)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
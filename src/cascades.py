@@ -0,0 +1,56 @@
+"""Cascaded shadow maps: the view frustum split into depth ranges, each
+shadowed through its own orthographic light view fitted tightly around it."""
+__author__ = "Micah Larson"
+__date__   = "$Oct 16, 2026 11:06:38 PM$"
+
+import math
+
+import numpy
+
+BLEND = 0.75 #share of logarithmic (against even) spacing in splits()
+
+def splits(near, far, count, blend=BLEND):
+    """Return the far depth of each of count ranges that split [near, far],
+    blending logarithmic (blend 1) and even (blend 0) spacing.
+    
+    """
+    fractions = numpy.arange(1, count + 1) / float(count)
+    return (blend * near * (far / near) ** fractions +
+            (1 - blend) * (near + (far - near) * fractions))
+
+def slice_sphere(camera, center, up, fieldOfView, aspect, near, far):
+    """Return (center, radius) of a sphere around the slice of the view frustum
+    between depths near and far.
+    
+    """
+    camera = numpy.array(camera, numpy.float64)
+    forward = numpy.subtract(center, camera)
+    forward /= numpy.sqrt((forward ** 2).sum())
+    right = numpy.cross(forward, up)
+    right /= numpy.sqrt((right ** 2).sum())
+    upward = numpy.cross(right, forward)
+    tangent = math.tan(math.radians(fieldOfView) / 2)
+    corners = [camera + depth * (forward + x * tangent * aspect * right +
+                                 y * tangent * upward)
+               for depth in (near, far) for x in (-1, 1) for y in (-1, 1)]
+    middle = numpy.mean(corners, axis=0)
+    return (middle, numpy.sqrt(((corners - middle) ** 2).sum(axis=1)).max())
+
+def light_view(direction, center, radius, resolution, bounds):
+    """Return (eye, target, up, depth) of an orthographic light view along
+    direction around a sphere, its target snapped to whole texels.
+    
+    """
+    direction = numpy.array(direction, numpy.float64)
+    up = numpy.array([0.0, 0.0, 1.0])
+    if abs(direction[2]) > 0.99:
+        up = numpy.array([0.0, 1.0, 0.0])
+    right = numpy.cross(direction, up)
+    right /= numpy.sqrt((right ** 2).sum())
+    up = numpy.cross(right, direction)
+    texel = 2.0 * radius / resolution
+    target = direction * numpy.dot(center, direction)
+    for axis in (right, up):
+        target += axis * texel * round(numpy.dot(center, axis) / texel)
+    reach = radius + bounds + numpy.sqrt((target ** 2).sum())
+    return (target - reach * direction, target, up, reach + radius)
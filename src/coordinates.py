@@ -4,6 +4,8 @@ __date__ ="$Mar 20, 2011 8:58:14 PM$"
 
 import math
 
+import numpy
+
 def spherical(x, y, z):
     """Return (rho, theta, phi) based on Cartesian coordinates."""
     # distance from origin
@@ -31,4 +33,11 @@ def magnitude(vector):
 
 def normalize(vector):
     """Return the unit vector."""
-    return [component / magnitude(vector) for component in vector]
\ No newline at end of file
+    return [component / magnitude(vector) for component in vector]
+
+def normalize_rows(vectors):
+    """Return the unit vectors of each row of an (n, 3) array."""
+    vectors = numpy.asarray(vectors)
+    lengths = numpy.sqrt((vectors * vectors).sum(axis=1))
+    lengths[lengths == 0] = 1 #leave degenerate vectors alone
+    return vectors / lengths[:, numpy.newaxis].astype(vectors.dtype)
\ No newline at end of file
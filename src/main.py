@@ -7,14 +7,21 @@ from OpenGL.GL import *                     #@UnusedWildImport
 from OpenGL.GLU import *                    #@UnusedWildImport
 from OpenGL.GLUT import *                   #@UnusedWildImport
 from OpenGL.GL.framebufferobjects import *  #@UnusedWildImport
+from OpenGL.GL.EXT.framebuffer_blit import * #@UnusedWildImport
 
 import math
 import platform
+import random
+import time
 
+import cache
+import cascades
 import coordinates
 import lighting
-from objects import gl_objects, spacecraft
+from objects import gl_objects, shading, spacecraft
+import shadow_atlas
 import skybox
+import spatial
 import textures
 import util
 
@@ -63,13 +70,29 @@ class SpaceFlight(object):
         self.Sdim = self.shadowdim
         self.Tdim = self.shadowdim
         self.ambienceNotSupported = False
+        #light and shadow in one GLSL pass if possible ('g'), which falls back
+        #  to the fixed function passes where it is not
+        self.useShaders = True
         self.frameBufferID = 0
+        self.shadowTexture = 0 #depth texture (the frame buffer's, if used)
+        self.staticFrameBufferID = 0 #depth of the static shadow casters
+        self.staticShadowState = None #light view and casters it was drawn for
+        #grid the shadow map's target is snapped to (0 aims it at the camera's
+        #  focus); a grid lets the static casters' depth be reused until the
+        #  focus leaves its cell, at the cost of shifting the map's framing
+        self.shadowSnap = 0.0
+        self.cascades = 3 #shadow map cascades when shaded (0: one shadow map)
+        self.cascadeDistance = 1000.0 #eye depth the cascades shadow out to
+        self.atlas = shadow_atlas.ShadowAtlas() #every light's maps, when shaded
+        self.shadowTileSize = 1024 #square of the atlas each light view gets
+        self.shadows = [] #(light index, far eye depth, world -> atlas) of each
         self.S = []   #texture plane S
         self.T = []   #texture plane T
         self.R = []   #texture plane R
         self.Q = []   #texture plane Q
         
         #perspective
+        self.fieldOfView = 40.0
         self.zNear = 1.0
         self.zFar = 2000.0
         
@@ -77,6 +100,9 @@ class SpaceFlight(object):
         self.spacecraft = None
         self.bolts = []
         self.scenery = []
+        self.index = None #spatial index of the scenery and bolts
+        self.extraAsteroids = 0 #scattered about the scene (see --asteroids)
+        self.occlusionCulling = True #skip objects hidden behind large ones
         self.particles = None
         self.axes = None
         
@@ -85,23 +111,57 @@ class SpaceFlight(object):
         self.drawAxes = False
         self.dt = 50 #number of milliseconds between calls to glutTimerFunc
         self.plasmaBoltSpeed = 5.0
+        self.streamTextures = True #show placeholders while textures load
+        self.frameTime = 0.0 #seconds display() takes (averaged; see debug)
         
         #rendering shadows for the particles requires better hardware than is
         #available to me
         self.shadowedParticles = False
     
-    def draw_objects(self):
-        """Draw the objects in self.scenery."""
-        try:
-            for object in self.scenery:
-                object.draw()
-        except AttributeError as error:
-            print >> sys.stderr, 'Invalid object: %s' % error
+    def draw_objects(self, *objects):
+        """Draw the objects in self.index (the scenery and bolts) and any others
+        given that are in view and not hidden (see draw_culled()).
+        
+        """
+        self.draw_culled(gl_objects.cull(objects, self.index))
+    
+    def draw_culled(self, objects):
+        """Draw objects already culled to the view frustum, less those (if
+        occlusion culling is on) hidden behind the largest of them.
+        
+        """
+        if self.occlusionCulling and gl_objects.occlusion.init():
+            objects = gl_objects.occlusion.cull(objects, self.submit_objects)
+        self.submit_objects(objects)
+    
+    def submit_objects(self, objects):
+        """Draw objects through the render queue, which batches them by
+        texture and material (and draws bolts and particles last).
+        
+        """
+        for object in objects:
+            if hasattr(object, 'submit'):
+                object.submit(gl_objects.queue)
+            else:
+                print >> sys.stderr, 'Invalid object: %r' % (object,)
+        gl_objects.flush()
                 
     def fire_blasters(self):
-        """Append a pair of plasma bolts to self.bolts."""
+        """Append a pair of plasma bolts to self.bolts (and self.index)."""
         self.bolts.append(gl_objects.PlasmaBolts(self.plasmaBoltSpeed,
                 self.spacecraft.translation, self.spacecraft.rotation))
+        self.index.insert(self.bolts[-1])
+    
+    def bolt_hit(self, bolt):
+        """Return whether a bolt's next move runs into the scenery (the box of
+        anything in self.index but another bolt).
+        
+        """
+        for (distance, object) in self.index.query_ray(bolt.translation,
+                bolt.rotation[0:3], bolt.speed):
+            if not isinstance(object, gl_objects.PlasmaBolts):
+                return True
+        return False
     
     def diff(self, x, y):
         return x - y
@@ -127,11 +187,18 @@ class SpaceFlight(object):
         #update position of camera and focal point (center) using ds
         self.adjust_camera(ds)
         
-        for bolt in self.bolts:
-            if coordinates.distance(*bolt.translation) > self.zFar:
+        for bolt in list(self.bolts):
+            if (coordinates.distance(*bolt.translation) > self.zFar or
+                    self.bolt_hit(bolt)):
                 self.bolts.remove(bolt)
+                self.index.remove(bolt)
+                gl_objects.occlusion.forget(bolt)
             else:
                 bolt.move()
+                self.index.move(bolt)
+        
+        if self.index.unbounded:
+            self.index.bound()
         
         self.draw_shadow_map()
         
@@ -145,6 +212,7 @@ class SpaceFlight(object):
     def toggle_debug(self):
         """Toggle on-screen debug printouts."""
         self.debug = not self.debug
+        gl_objects.library.debug = self.debug
     
     def toggle_camera_mode(self):
         """Toggle 1st-person / 3rd-person mode."""
@@ -160,6 +228,26 @@ class SpaceFlight(object):
         """Toggle whether particles cast shadows."""
         self.shadowedParticles = not self.shadowedParticles
     
+    def toggle_occlusion_culling(self):
+        """Toggle skipping objects hidden behind others."""
+        self.occlusionCulling = not self.occlusionCulling
+    
+    def toggle_shaders(self):
+        """Toggle single pass (GLSL) / fixed function lighting and shadows."""
+        self.useShaders = not self.useShaders
+        self.draw_shadow_map()
+    
+    def cycle_cascades(self):
+        """Cycle the number of shadow map cascades (0 for one shadow map),
+        which only the shaders can draw.
+        
+        """
+        if not (self.useShaders and shading.init()):
+            print >> sys.stderr, 'Shadow map cascades need the shaders'
+            return
+        self.cascades = (self.cascades + 1) % (shading.MAX_CASCADES + 1)
+        self.draw_shadow_map()
+    
     def init_scene(self):
         """Initialize lighting, textures, etc."""
         glEnable(GL_NORMALIZE)
@@ -175,10 +263,7 @@ class SpaceFlight(object):
         glPolygonOffset(4, 0)
         
         #initialize textures
-        textures.init()
-        
-        #initialize objects
-        gl_objects.init()
+        textures.init(self.streamTextures)
         
         #place objects in scene
         self.scenery.append(gl_objects.Asteroid('bacchus',
@@ -234,12 +319,34 @@ class SpaceFlight(object):
                 translation=[-100.0, 500.0, 100.0],
                 scale=[150.0, 150.0, 150.0]))
         
+        #scatter any extra asteroids (the same ones each run) through the
+        #  scene, from the models above
+        names = sorted(set(object.name for object in self.scenery))
+        scatter = random.Random(self.extraAsteroids)
+        for i in xrange(self.extraAsteroids):
+            size = scatter.uniform(2.0, 20.0)
+            self.scenery.append(gl_objects.Asteroid(scatter.choice(names),
+                    translation=[scatter.uniform(-900.0, 900.0)
+                                 for axis in xrange(3)],
+                    scale=[size, size, size]))
+        
+        #check the models the scene uses (each is parsed if its cache is
+        #  stale, and uploaded, when first drawn)
+        gl_objects.init(set(object.name for object in self.scenery
+                if isinstance(object, gl_objects.Asteroid)))
+        gl_objects.library.debug = self.debug
+        
         self.scenery.append(gl_objects.Sphere([], [], True,
                 textures.textures['earth'],
                 translation=[-100.0, 500.0, 100.0],
                 scale=[10.0, 10.0, 10.0],
                 emissive=[1.0, 1.0, 1.0]))
         
+        #index the scenery for culling (objects whose models are not compiled
+        #  yet are indexed once they are; see timer())
+        self.index = spatial.SpatialIndex()
+        self.index.build(self.scenery)
+        
         self.spacecraft = spacecraft.TIEFighter()
         self.particles = gl_objects.ParticleField(sigma=500)
         
@@ -268,13 +375,18 @@ class SpaceFlight(object):
             self.frameBufferID = glGenFramebuffersEXT(1)
             glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, self.frameBufferID)
             
-            #set render buffer size to shadow map
-            renderBufferID = glGenRenderbuffersEXT(1)
-            glBindRenderbufferEXT(GL_RENDERBUFFER_EXT, renderBufferID)
-            glRenderbufferStorageEXT(GL_RENDERBUFFER_EXT, GL_DEPTH_COMPONENT32,
-                int(self.shadowdim), int(self.shadowdim))
-            glFramebufferRenderbufferEXT(GL_FRAMEBUFFER_EXT,
-                GL_DEPTH_ATTACHMENT_EXT, GL_RENDERBUFFER_EXT, renderBufferID)
+            #size the shadow texture to the shadow map and render depth
+            #  straight into it (nothing is copied after drawing)
+            if self.MultiTex:
+                glActiveTexture(GL_TEXTURE1)
+            glBindTexture(GL_TEXTURE_2D, self.shadowTexture)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_DEPTH_COMPONENT32,
+                int(self.shadowdim), int(self.shadowdim), 0,
+                GL_DEPTH_COMPONENT, GL_UNSIGNED_INT, None)
+            if self.MultiTex:
+                glActiveTexture(GL_TEXTURE0)
+            glFramebufferTexture2DEXT(GL_FRAMEBUFFER_EXT,
+                GL_DEPTH_ATTACHMENT_EXT, GL_TEXTURE_2D, self.shadowTexture, 0)
             
             glDrawBuffer(GL_NONE) #don't write to visible color
             glReadBuffer(GL_NONE) #don't read from visible color
@@ -283,6 +395,28 @@ class SpaceFlight(object):
             status = glCheckFramebufferStatusEXT(GL_FRAMEBUFFER_EXT)
             if status != GL_FRAMEBUFFER_COMPLETE_EXT:
                 raise Exception('Error setting up frame buffer')
+            
+            #a second depth buffer caches the static casters, if its depth can
+            #  be copied (blitted) into the first
+            if bool(glBlitFramebufferEXT):
+                self.staticFrameBufferID = glGenFramebuffersEXT(1)
+                glBindFramebufferEXT(GL_FRAMEBUFFER_EXT,
+                        self.staticFrameBufferID)
+                renderBufferID = glGenRenderbuffersEXT(1)
+                glBindRenderbufferEXT(GL_RENDERBUFFER_EXT, renderBufferID)
+                glRenderbufferStorageEXT(GL_RENDERBUFFER_EXT,
+                    GL_DEPTH_COMPONENT32, int(self.shadowdim),
+                    int(self.shadowdim))
+                glFramebufferRenderbufferEXT(GL_FRAMEBUFFER_EXT,
+                    GL_DEPTH_ATTACHMENT_EXT, GL_RENDERBUFFER_EXT,
+                    renderBufferID)
+                glDrawBuffer(GL_NONE)
+                glReadBuffer(GL_NONE)
+                status = glCheckFramebufferStatusEXT(GL_FRAMEBUFFER_EXT)
+                if status != GL_FRAMEBUFFER_COMPLETE_EXT:
+                    print >> sys.stderr, 'Unable to cache static shadows'
+                    glDeleteFramebuffersEXT([self.staticFrameBufferID])
+                    self.staticFrameBufferID = 0
             glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, 0)
             
             self.draw_shadow_map() #create shadow map
@@ -297,8 +431,8 @@ class SpaceFlight(object):
             glActiveTexture(GL_TEXTURE1)
         #allocate and bind shadow texture
         glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
-        shadowtex = glGenTextures(1)
-        glBindTexture(GL_TEXTURE_2D, shadowtex)
+        self.shadowTexture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.shadowTexture)
         
         #map single depth value to RGBA (this is called intensity)
         glTexParameteri(GL_TEXTURE_2D, GL_DEPTH_TEXTURE_MODE, GL_INTENSITY)
@@ -329,14 +463,20 @@ class SpaceFlight(object):
             glActiveTexture(GL_TEXTURE0)
     
     def draw_shadow_map(self, bounds=1000.0):
-        """Draw the shadow map.  This needs to be called whenever any object or
-        light moves.
+        """Draw the shadow map of the primary light, redrawing the static
+        casters' cached depth only when the view changes or one is placed.
+        When shaded (the default), draw_shadow_atlas() shadows every light.
         
         @param bounds bounding radius of scene
         
-        TODO: support multiple lights
-        
         """
+        #the atlas needs the shaders, and frame buffers to draw and cache into
+        if (self.frameBufferID > 0 and bool(glBlitFramebufferEXT) and
+                self.useShaders and shading.init()):
+            self.draw_shadow_atlas(bounds)
+            return
+        self.shadows = []
+        
         #save transforms and modes
         glPushMatrix()
         glPushAttrib(GL_TRANSFORM_BIT | GL_ENABLE_BIT | GL_VIEWPORT_BIT)
@@ -348,37 +488,57 @@ class SpaceFlight(object):
         #turn off lighting
         self.enable_lighting(False)
         
-        #distance of light from origin, ensuring it's out of bounds
-        lightPos = self.lights['primary'].position
-        lightDistance = max(coordinates.distance(*lightPos[0:3]), 1.1 * bounds)
-        
         #set perspective view from light position
-        self.set_perspective(float(self.Sdim), float(self.Tdim),
-                lightDistance - bounds, lightDistance + bounds,
-                60.0 * math.atan(bounds / lightDistance))
-        gluLookAt(*(lightPos + self.center + self.up))
+        lightPos = self.lights['primary'].position
+        target = self.set_light_view(self.lights['primary'], bounds,
+                float(self.Sdim), float(self.Tdim))
         
         #size viewport to desired dimensions
         glViewport(0, 0, int(self.Sdim), int(self.Tdim))
         
-        #redirect traffic to the frame buffer
-        if self.frameBufferID > 0:
-            glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, self.frameBufferID)
-        
-        #clear the depth buffer
-        glClear(GL_DEPTH_BUFFER_BIT)
-        self.draw_objects() #draw all objects that can cast a shadow
+        gl_objects.begin_view('light')
+        static = list(self.scenery)
         if self.shadowedParticles:
-            self.particles.draw()
-        self.spacecraft.draw()
-        
-        #copy depth values into depth texture
-        if self.MultiTex:
-            glActiveTexture(GL_TEXTURE1)
-        glCopyTexImage2D(GL_TEXTURE_2D, 0, GL_DEPTH_COMPONENT, 0, 0,
-            int(self.Sdim), int(self.Tdim), 0)
-        if self.MultiTex:
-            glActiveTexture(GL_TEXTURE0)
+            static.append(self.particles)
+        dynamic = [self.spacecraft] + self.bolts
+        if self.staticFrameBufferID > 0:
+            #redraw the static casters only if they or the view changed
+            state = (tuple(lightPos), tuple(target), len(static),
+                    gl_objects.moves)
+            if state != self.staticShadowState:
+                glBindFramebufferEXT(GL_FRAMEBUFFER_EXT,
+                        self.staticFrameBufferID)
+                glClear(GL_DEPTH_BUFFER_BIT)
+                self.submit_objects(gl_objects.cull(static))
+                self.staticShadowState = state
+            #start from their depth
+            glBindFramebufferEXT(GL_READ_FRAMEBUFFER_EXT,
+                    self.staticFrameBufferID)
+            glBindFramebufferEXT(GL_DRAW_FRAMEBUFFER_EXT, self.frameBufferID)
+            glBlitFramebufferEXT(0, 0, int(self.Sdim), int(self.Tdim),
+                    0, 0, int(self.Sdim), int(self.Tdim),
+                    GL_DEPTH_BUFFER_BIT, GL_NEAREST)
+            glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, self.frameBufferID)
+        else:
+            #redirect traffic to the frame buffer
+            if self.frameBufferID > 0:
+                glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, self.frameBufferID)
+            
+            #clear the depth buffer; every caster is drawn
+            glClear(GL_DEPTH_BUFFER_BIT)
+            dynamic = static + dynamic
+        self.draw_culled(gl_objects.cull(dynamic))
+        gl_objects.view = 'camera'
+        
+        #copy depth values into depth texture (unless the frame buffer drew
+        #  into it)
+        if self.frameBufferID == 0:
+            if self.MultiTex:
+                glActiveTexture(GL_TEXTURE1)
+            glCopyTexImage2D(GL_TEXTURE_2D, 0, GL_DEPTH_COMPONENT, 0, 0,
+                int(self.Sdim), int(self.Tdim), 0)
+            if self.MultiTex:
+                glActiveTexture(GL_TEXTURE0)
         
         #retrieve light projection and modelview matrices
         lightProjectionMatrix = glGetDoublev(GL_PROJECTION_MATRIX)
@@ -413,10 +573,134 @@ class SpaceFlight(object):
         if self.frameBufferID > 0:
             glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, 0)
     
+    def set_light_view(self, light, bounds, width=1.0, height=1.0):
+        """Set a perspective view from a light's position, aimed at the
+        camera's focus (snapped to a grid of self.shadowSnap, if set), and
+        return that target.
+        
+        @param bounds bounding radius of scene
+        
+        """
+        position = light.position[0:3]
+        
+        #distance of light from origin, ensuring it's out of bounds
+        lightDistance = max(coordinates.distance(*position), 1.1 * bounds)
+        
+        target = list(self.center)
+        if self.shadowSnap > 0:
+            target = [self.shadowSnap * round(n / self.shadowSnap)
+                    for n in target]
+        direction = map(lambda x, y: x - y, target, position)
+        up = [0.0, 0.0, 1.0]
+        if abs(direction[2]) > 0.99 * coordinates.distance(*direction):
+            up = [0.0, 1.0, 0.0]
+        self.set_perspective(width, height,
+                lightDistance - bounds, lightDistance + bounds,
+                60.0 * math.atan(bounds / lightDistance))
+        gluLookAt(*(position + target + up))
+        return target
+    
+    def set_cascade_view(self, light, near, far, bounds):
+        """Set the orthographic view from a light fitted around the slice of
+        the view frustum between eye depths near and far.
+        
+        @param bounds bounding radius of scene
+        
+        """
+        direction = coordinates.normalize([-n for n in light.position[0:3]])
+        aspect = (float(self.width) / self.height) if (self.height > 0) else 1
+        (center, radius) = cascades.slice_sphere(self.camera, self.center,
+                self.up, self.fieldOfView, aspect, near, far)
+        (eye, target, up, depth) = cascades.light_view(direction, center,
+                radius, self.atlas.tileSize, bounds)
+        glMatrixMode(GL_PROJECTION)
+        glLoadIdentity()
+        glOrtho(-radius, radius, -radius, radius, 0.0, depth)
+        glMatrixMode(GL_MODELVIEW)
+        glLoadIdentity()
+        gluLookAt(*(list(eye) + list(target) + list(up)))
+    
+    def draw_shadow_atlas(self, bounds=1000.0):
+        """Draw every light's shadow maps into the shadow atlas, a tile each
+        (the primary light's as self.cascades cascades, if any), redrawing a
+        tile only when its view or casters change.
+        
+        @param bounds bounding radius of scene
+        
+        """
+        #(light, near, far eye depth) of each view; near is None for the
+        #  whole scene
+        primary = self.lights['primary']
+        views = [(primary, None, self.zFar)]
+        if self.cascades > 0:
+            far = list(cascades.splits(self.zNear, self.cascadeDistance,
+                    self.cascades))
+            views = zip([primary] * self.cascades, [self.zNear] + far[:-1],
+                    far)
+        views += [(light, None, self.zFar) for light in
+                sorted(self.lights.values(), key=lambda light: light.id)
+                if light is not primary]
+        self.atlas.init(len(views), self.shadowTileSize, self.shadowdim)
+        
+        #save transforms and modes
+        glPushMatrix()
+        glPushAttrib(GL_TRANSFORM_BIT | GL_ENABLE_BIT | GL_VIEWPORT_BIT)
+        
+        glShadeModel(GL_FLAT)   #no smoothing
+        glColorMask(0, 0, 0, 0) #no writing to color buffer
+        glEnable(GL_POLYGON_OFFSET_FILL) #overcome imprecision
+        self.enable_lighting(False)
+        
+        #the scenery comes from self.index (less the bolts in it)
+        static = [self.particles] if self.shadowedParticles else []
+        dynamic = [self.spacecraft] + self.bolts
+        self.shadows = []
+        for (i, (light, near, far)) in enumerate(views):
+            tile = self.atlas.tiles[i]
+            if near is None:
+                self.set_light_view(light, bounds)
+            else:
+                self.set_cascade_view(light, near, far, bounds)
+            projection = glGetDoublev(GL_PROJECTION_MATRIX)
+            modelview = glGetDoublev(GL_MODELVIEW_MATRIX)
+            glViewport(*tile.viewport) #(for the levels of detail chosen)
+            gl_objects.begin_view('shadow %d' % i)
+            
+            #redraw the static casters only if they or the view changed
+            state = (projection.tostring(), modelview.tostring(), len(static),
+                    gl_objects.moves)
+            if state != tile.staticState:
+                self.atlas.begin_static(tile)
+                self.submit_objects([object for object in
+                        gl_objects.cull(static, self.index)
+                        if not isinstance(object, gl_objects.PlasmaBolts)])
+                (tile.staticState, tile.state) = (state, None)
+            
+            #and the tile only if that or the dynamic casters in it changed
+            moving = gl_objects.cull(dynamic)
+            state = (state, tuple(gl_objects.placement(object)
+                    for object in moving))
+            if state != tile.state:
+                self.atlas.begin(tile)
+                self.draw_culled(moving)
+                tile.state = state
+            self.shadows.append((light.id - GL_LIGHT0, far,
+                    self.atlas.texture_matrix(tile, projection, modelview)))
+        gl_objects.view = 'camera'
+        
+        #restore normal drawing state
+        glShadeModel(GL_SMOOTH)
+        glColorMask(1, 1, 1, 1)
+        glDisable(GL_POLYGON_OFFSET_FILL)
+        glPopAttrib()
+        glPopMatrix()
+        self.atlas.end()
+    
     def enable_lighting(self, on=True):
         """Enable/disable lighting (and related)."""
         if on:
-            self.lights['primary'].commit_properties()
+            for light in self.lights.values():
+                light.commit_properties()
             glEnable(GL_LIGHTING)
             glEnable(GL_NORMALIZE)
         else:
@@ -447,46 +731,61 @@ class SpaceFlight(object):
         self.lights['primary'].diffuse =  [0.3,  0.3,  0.3]
         self.lights['primary'].specular = [0.05, 0.05, 0.05]
         self.lights['primary'].commit_properties()
-        self.draw_objects()
-        self.particles.draw()
-        self.spacecraft.draw()
+        self.draw_objects(self.particles, self.spacecraft)
         # Enable alpha test so that shadowed fragments are discarded
         #glAlphaFunc(GL_GREATER, 0.9) #causes problems for some nvidia hardware
         glEnable(GL_ALPHA_TEST)
     
     def display(self):
         """Display scene."""
+        start = time.time()
+        shaded = self.useShaders and shading.init()
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        gl_objects.reset_statistics()
+        textures.update() #stream in the next part of any loading textures
         #glLoadIdentity()
         
         glDisable(GL_LIGHTING) #disable lighting for first pass
         
-        self.set_perspective(self.width, self.height, self.zNear, self.zFar)
+        self.set_perspective(self.width, self.height, self.zNear, self.zFar,
+                self.fieldOfView)
         
         #set viewer orientation
         gluLookAt(*(self.camera + self.center + self.up))
-        
-        #  Shadow pass - needed if ambient shadows are not supported
-        if self.ambienceNotSupported:
+        gl_objects.begin_view('camera')
+        shadowed = shaded and bool(self.shadows)
+        #the programs (instancing's too, unshaded) light up to the last
+        #  enabled light
+        enabled = [light.id - GL_LIGHT0 + 1 for light in self.lights.values()
+                   if glIsEnabled(light.id)]
+        shading.set_shadows(max(enabled + [0]), self.shadows)
+        
+        #  Shadow pass - needed if ambient shadows are not supported (and not
+        #  shaded, which lights and shadows in one pass)
+        if self.ambienceNotSupported and not shaded:
             self.draw_shadow_pass()
         
         #set up shadow texture comparison
         if self.MultiTex:
             glActiveTexture(GL_TEXTURE1)
+        glBindTexture(GL_TEXTURE_2D,
+                self.atlas.texture if shadowed else self.shadowTexture)
         glEnable(GL_TEXTURE_2D)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_COMPARE_MODE,
            GL_COMPARE_R_TO_TEXTURE)
         
         #set up the eye plane for projecting the shadow map on the scene
-        glEnable(GL_TEXTURE_GEN_S); glTexGenfv(GL_S, GL_EYE_PLANE, self.S)
-        glEnable(GL_TEXTURE_GEN_T); glTexGenfv(GL_T, GL_EYE_PLANE, self.T)
-        glEnable(GL_TEXTURE_GEN_R); glTexGenfv(GL_R, GL_EYE_PLANE, self.R)
-        glEnable(GL_TEXTURE_GEN_Q); glTexGenfv(GL_Q, GL_EYE_PLANE, self.Q)
+        #  (the atlas' maps are projected by their own matrices)
+        if not shadowed:
+            glEnable(GL_TEXTURE_GEN_S); glTexGenfv(GL_S, GL_EYE_PLANE, self.S)
+            glEnable(GL_TEXTURE_GEN_T); glTexGenfv(GL_T, GL_EYE_PLANE, self.T)
+            glEnable(GL_TEXTURE_GEN_R); glTexGenfv(GL_R, GL_EYE_PLANE, self.R)
+            glEnable(GL_TEXTURE_GEN_Q); glTexGenfv(GL_Q, GL_EYE_PLANE, self.Q)
         if self.MultiTex:
             glActiveTexture(GL_TEXTURE0)
         
         #re-enable lighting
-        if self.ambienceNotSupported:
+        if self.ambienceNotSupported and not shaded:
             self.lights['primary'].ambient = self.lightingDefaults['ambient']
             self.lights['primary'].diffuse = self.lightingDefaults['diffuse']
             self.lights['primary'].specular = self.lightingDefaults['specular']
@@ -494,11 +793,11 @@ class SpaceFlight(object):
         self.enable_lighting(True)
         
         #draw objects in scene
-        self.particles.draw()
-        self.draw_objects()
-        for bolt in self.bolts:
-            bolt.draw()
-        self.spacecraft.draw()
+        if shaded:
+            shading.begin()
+        self.draw_objects(self.particles, self.spacecraft)
+        if shaded:
+            shading.end()
         
         #disable textures and texture generation
         if self.MultiTex:
@@ -512,7 +811,7 @@ class SpaceFlight(object):
             glActiveTexture(GL_TEXTURE0)
         
         #disable alpha test if the shadow pass is done
-        if self.ambienceNotSupported:
+        if self.ambienceNotSupported and not shaded:
             glDisable(GL_ALPHA_TEST)
         
         if self.drawAxes:
@@ -525,8 +824,23 @@ class SpaceFlight(object):
             util.print_to_screen(
                 'Camera: (%0.2f, %0.2f, %0.2f); Light: (%0.2f, %0.2f, %0.2f)' %
                 tuple(self.camera + self.lights['primary'].position))
+            util.print_to_screen('Asteroid triangles: %d of %d' % (
+                gl_objects.statistics['triangles'],
+                gl_objects.statistics['fullTriangles']), position=[2, 22])
+            util.print_to_screen('State changes: %(textures)d textures, '
+                '%(materials)d materials, %(buffers)d buffers; %(draws)d draws'
+                % gl_objects.queue.statistics, position=[2, 42])
+            util.print_to_screen('Objects: %(visible)d in view (%(occluded)d '
+                'occluded), %(culled)d culled' % gl_objects.statistics,
+                position=[2, 62])
+            util.print_to_screen('Frame: %0.1f ms (%s)' % (
+                1000.0 * self.frameTime,
+                'shaders' if shaded else 'fixed function'), position=[2, 82])
         
         glFlush()
+        if self.debug:
+            glFinish() #so the frame time includes drawing
+        self.frameTime += 0.1 * (time.time() - start - self.frameTime)
         glutSwapBuffers()
     
     def toggle_ambience(self):
@@ -539,8 +853,11 @@ class SpaceFlight(object):
             {
               '\x1b': lambda : sys.exit(0),         #<escape>
               'a':    lambda : self.toggle_axes(),
+              'c':    lambda : self.cycle_cascades(),
               'd':    lambda : self.toggle_debug(),
+              'g':    lambda : self.toggle_shaders(),
               'm':    lambda : self.toggle_camera_mode(),
+              'o':    lambda : self.toggle_occlusion_culling(),
               'r':    lambda : self.toggle_ambience(),
               's':    lambda : self.toggle_particle_shadows(),
               ' ':    lambda : self.fire_blasters() #<space>
@@ -663,4 +980,9 @@ if __name__ == '__main__':
     version = platform.python_version()
     if version < '2.7.1':
         sys.exit('requires python 2.7.1 (found %s)' % version)
-    SpaceFlight().main()
+    if '--rebuild-cache' in sys.argv:
+        cache.clear() #rebuild cached meshes from their source files
+    flight = SpaceFlight()
+    if '--asteroids' in sys.argv: #--asteroids N adds N more asteroids
+        flight.extraAsteroids = int(sys.argv[sys.argv.index('--asteroids') + 1])
+    flight.main()
@@ -6,19 +6,335 @@ from OpenGL.GL import *   #@UnusedWildImport
 from OpenGL.GLU import *  #@UnusedWildImport
 from OpenGL.GLUT import * #@UnusedWildImport
 
+import collections
+import ctypes
+import functools
 import math
 import random
 
+import numpy
+
+import instancing
 import models
+import render_queue
 import util
 
+SEGMENTS = (8, 16, 32, 64, 128) #segment counts procedural primitives may use
+SEGMENT_PIXELS = 12.0 #length (pixels) of a silhouette segment to aim for
+SEGMENT_HYSTERESIS = 0.25 #fraction of a count a need must pass to switch
+OCCLUDER_PIXELS = 64.0 #projected radius (pixels) from which objects occlude
+OCCLUDERS = 8 #most occluders drawn ahead of the occlusion queries of a pass
+#corners (of 8, by bits x=1, y=2, z=4) of the 6 faces of a box, as quads
+BOX_FACES = numpy.array([0, 2, 6, 4,  1, 5, 7, 3,  0, 4, 5, 1,
+                         2, 3, 7, 6,  0, 1, 3, 2,  4, 6, 7, 5])
+
 library = models.ModelLibrary()
+queue = render_queue.RenderQueue() #draws of the scene, batched by state
+asteroids = None #AsteroidInstances that flush() queues (created by init())
+occlusion = None #OcclusionCulling of the scene (created by init())
+view = 'camera' #the view being drawn; levels of detail are chosen per view
+transforms = None #(modelview, projection, viewport) of view (see begin_view())
+#since reset(): asteroid triangles drawn (of their full detail); objects
+#  submitted and culled by frustum, and skipped as occluded (over every pass)
+statistics = {'triangles': 0, 'fullTriangles': 0, 'visible': 0, 'culled': 0,
+              'occluded': 0}
+geometries = {} #shared primitive Geometry, by type and parameters
+moves = 0 #times a Stationary object has been placed (cached drawings' key)
+
+def init(models=None):
+    """Initialize the module, checking the mesh cache for the named models
+    (default: all of them).
+    
+    """
+    global asteroids, occlusion
+    library.init(models)
+    asteroids = AsteroidInstances()
+    occlusion = OcclusionCulling()
+
+def reset_statistics():
+    """Zero the drawing statistics and start a new frame (once per frame)."""
+    for key in statistics:
+        statistics[key] = 0
+    queue.reset()
+    library.next_frame()
+
+def flush():
+    """Queue the instanced draws of the Asteroids submitted since the last
+    flush, then issue (and clear) the render queue.
+    
+    """
+    asteroids.submit(queue)
+    queue.flush()
+
+def begin_view(name):
+    """Start drawing the named view, reading its matrices and viewport once for
+    every projected_radius() of the pass.
+    
+    """
+    global view, transforms
+    view = name
+    #matrices are column major: [column][row]
+    transforms = (glGetDoublev(GL_MODELVIEW_MATRIX),
+            glGetDoublev(GL_PROJECTION_MATRIX), glGetIntegerv(GL_VIEWPORT))
+
+def projected_radius(center, radius):
+    """Return the radius, in pixels, of a sphere in the view last begun
+    (infinite if the eye is inside it).
+    
+    """
+    return float(projected_radii([center], [radius])[0])
+
+def projected_radii(centers, radii):
+    """Return projected_radius() of many spheres at once, as an array."""
+    (modelview, projection, viewport) = transforms
+    centers = numpy.asarray(centers, numpy.float64).reshape(-1, 3)
+    eye = numpy.dot(numpy.column_stack((centers, numpy.ones(len(centers)))),
+            modelview)
+    #the largest scale of the modelview matrix along any model space axis
+    scale = numpy.sqrt((modelview[0:3, 0:3] ** 2).sum(axis=1)).max()
+    radii = numpy.asarray(radii, numpy.float64) * scale
+    #clip space w: the distance to the eye in perspective, 1 in orthographic
+    w = projection[2][3] * eye[:, 2] + projection[3][3]
+    inside = w <= -radii * projection[2][3]
+    w[inside] = 1.0
+    pixels = radii * projection[1][1] * viewport[3] / (2.0 * w)
+    pixels[inside] = float('inf')
+    return pixels
+
+def choose_segments(pixels, current=None):
+    """Return the count in SEGMENTS to tessellate a round shape of a given
+    projected radius with (the current count, if close enough).
+    
+    """
+    needed = 2 * math.pi * pixels / SEGMENT_PIXELS
+    if current in SEGMENTS:
+        index = SEGMENTS.index(current)
+        lower = SEGMENTS[index - 1] if index > 0 else 0
+        if (lower * (1 - SEGMENT_HYSTERESIS) <= needed and
+                (needed <= current * (1 + SEGMENT_HYSTERESIS) or
+                 current == SEGMENTS[-1])):
+            return current
+    for count in SEGMENTS:
+        if count >= needed:
+            return count
+    return SEGMENTS[-1]
+
+def frustum_planes():
+    """Return the planes (a, b, c, d) of the current view frustum, with unit
+    normals pointing in.
+    
+    """
+    modelview = glGetDoublev(GL_MODELVIEW_MATRIX)   #column major: [column][row]
+    projection = glGetDoublev(GL_PROJECTION_MATRIX)
+    clip = numpy.dot(modelview, projection).T #rows of projection * modelview
+    planes = numpy.array([clip[3] + clip[0], clip[3] - clip[0],  #left, right
+                          clip[3] + clip[1], clip[3] - clip[1],  #bottom, top
+                          clip[3] + clip[2], clip[3] - clip[2]]) #near, far
+    return planes / numpy.sqrt((planes[:, 0:3] ** 2).sum(axis=1))[:, None]
+
+def cull(objects, index=None):
+    """Return the objects (and those of a spatial.SpatialIndex, if given) at
+    least partly inside the view frustum.
+    
+    """
+    planes = frustum_planes()
+    visible = []
+    if index is not None:
+        visible = index.query_frustum(planes)
+        statistics['culled'] += len(index) - len(visible)
+    statistics['visible'] += len(visible)
+    for object in objects:
+        bounds = object.scene_bounds()
+        if bounds is None or bounds.visible(planes):
+            visible.append(object)
+            statistics['visible'] += 1
+        else:
+            statistics['culled'] += 1
+    return visible
 
-def init():
-    """Initialize the module by loading models."""
-    library.init()
+def placement(object):
+    """Return a hashable key of an object and where it is drawn."""
+    return (object, tuple(object.translation),
+            tuple(getattr(object, 'rotation', ())), tuple(object.scale))
+
+class Stationary(object):
+    """An object that stays where it is put; placing it counts in moves."""
+    def __setattr__(self, name, value):
+        """Set an attribute, counting placements in moves."""
+        global moves
+        if name in ('translation', 'rotation', 'scale'):
+            moves += 1
+        super(Stationary, self).__setattr__(name, value)
+
+class Bounds(object):
+    """A bounding sphere and axis aligned bounding box in model space."""
+    def __init__(self, lower, upper, center=None, radius=None):
+        """Constructor"""
+        super(Bounds, self).__init__()
+        self.lower = numpy.array(lower, numpy.float64)
+        self.upper = numpy.array(upper, numpy.float64)
+        if center is None:
+            center = (self.lower + self.upper) / 2
+        self.center = numpy.array(center, numpy.float64)
+        if radius is None:
+            radius = numpy.sqrt((numpy.maximum(self.upper - self.center,
+                    self.center - self.lower) ** 2).sum())
+        self.radius = float(radius)
+    
+    def transformed(self, translation, rotation=None, scale=(1.0, 1.0, 1.0)):
+        """Return these Bounds moved out of their model space by a scale,
+        rotation and translation (the box grows to stay axis aligned).
+        
+        """
+        if rotation is None:
+            matrix = numpy.diag(numpy.array(scale, numpy.float64))
+        else:
+            matrix = (numpy.array(rotation, numpy.float64).reshape(4, 4)[0:3,
+                    0:3].T * numpy.array(scale, numpy.float64))
+        offset = numpy.array(translation[0:3], numpy.float64)
+        middle = offset + numpy.dot(matrix, (self.lower + self.upper) / 2)
+        extent = numpy.dot(numpy.abs(matrix), (self.upper - self.lower) / 2)
+        return Bounds(middle - extent, middle + extent,
+                offset + numpy.dot(matrix, self.center),
+                self.radius * numpy.sqrt((matrix ** 2).sum(axis=0)).max())
+    
+    def visible(self, planes):
+        """Return whether these Bounds are at least partly inside the planes of
+        a frustum.
+        
+        """
+        normals = planes[:, 0:3]
+        distances = numpy.dot(normals, self.center) + planes[:, 3]
+        if (distances < -self.radius).any():
+            return False
+        if (distances >= self.radius).all():
+            return True
+        #the corner of the box farthest along each plane's normal
+        corners = numpy.where(normals >= 0, self.upper, self.lower)
+        return ((corners * normals).sum(axis=1) + planes[:, 3] >= 0).all()
+
+def box_quads(lowers, uppers):
+    """Return the faces of axis aligned boxes (rows of lower and upper
+    corners) as a float32 array of quads: 24 vertices per box.
+    
+    """
+    lowers = numpy.asarray(lowers, numpy.float32).reshape(-1, 1, 3)
+    uppers = numpy.asarray(uppers, numpy.float32).reshape(-1, 1, 3)
+    bits = (numpy.arange(8)[:, None] >> numpy.arange(3)) & 1
+    corners = numpy.where(bits[None] == 1, uppers, lowers) #(boxes, 8, 3)
+    return numpy.ascontiguousarray(corners[:, BOX_FACES].reshape(-1, 3))
+
+class OcclusionCulling(object):
+    """Skips objects hidden behind the largest ones on screen, by asynchronous
+    occlusion queries whose results are read a frame late.
+    
+    """
+    def __init__(self):
+        """Constructor"""
+        super(OcclusionCulling, self).__init__()
+        self.target = None #query target; False if queries are unsupported
+        self.pending = {} #(view, object) -> query awaiting its result
+        self.hidden = set() #(view, object) whose last result had no samples
+        self.free = [] #query names to reuse
+    
+    def init(self):
+        """Choose the query target (the first time) and return whether
+        occlusion queries are supported.
+        
+        """
+        if self.target is None:
+            extensions = (glGetString(GL_EXTENSIONS) or '').split()
+            if not bool(glGenQueries):
+                print >> sys.stderr, 'init> occlusion queries are not supported'
+                self.target = False
+            elif 'GL_ARB_occlusion_query2' in extensions:
+                self.target = GL_ANY_SAMPLES_PASSED
+            else:
+                self.target = GL_SAMPLES_PASSED
+        return bool(self.target)
+    
+    def cull(self, objects, draw):
+        """Draw the largest objects as occluders (by calling draw with a list),
+        then return the rest, less those last found hidden.
+        
+        """
+        self.collect()
+        boxes = [object.scene_bounds() for object in objects]
+        bounded = [i for i in xrange(len(objects)) if boxes[i] is not None]
+        pixels = projected_radii([boxes[i].center for i in bounded],
+                [boxes[i].radius for i in bounded])
+        ranked = sorted(((pixels[j], i) for (j, i) in enumerate(bounded)
+                if OCCLUDER_PIXELS <= pixels[j] < float('inf') and
+                objects[i].occluder), reverse=True)
+        occluders = set(i for (size, i) in ranked[0:OCCLUDERS])
+        draw([objects[i] for i in sorted(occluders)])
+        tested = []
+        for (j, i) in enumerate(bounded):
+            key = (view, objects[i])
+            if i in occluders or pixels[j] == float('inf'):
+                self.hidden.discard(key)
+            elif key not in self.pending:
+                tested.append(i)
+        self.query([objects[i] for i in tested], [boxes[i] for i in tested])
+        remaining = [objects[i] for i in xrange(len(objects))
+                if i not in occluders and (view, objects[i]) not in self.hidden]
+        statistics['occluded'] += (len(objects) - len(occluders) -
+                len(remaining))
+        return remaining
+    
+    def query(self, objects, boxes):
+        """Issue an occlusion query of each object's box (Bounds) against
+        the depth buffer, without writing to it or the color buffer.
+        
+        """
+        if not objects:
+            return
+        if len(self.free) < len(objects):
+            self.free.extend(numpy.atleast_1d(glGenQueries(len(objects) -
+                    len(self.free))).tolist())
+        vertices = box_quads([box.lower for box in boxes],
+                [box.upper for box in boxes])
+        glPushAttrib(GL_ENABLE_BIT | GL_COLOR_BUFFER_BIT |
+                GL_DEPTH_BUFFER_BIT)
+        glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+        for capability in (GL_LIGHTING, GL_TEXTURE_2D, GL_ALPHA_TEST,
+                GL_CULL_FACE):
+            glDisable(capability)
+        glColorMask(GL_FALSE, GL_FALSE, GL_FALSE, GL_FALSE)
+        glDepthMask(GL_FALSE)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, vertices)
+        for (i, object) in enumerate(objects):
+            name = self.free.pop()
+            glBeginQuery(self.target, name)
+            glDrawArrays(GL_QUADS, 24 * i, 24)
+            glEndQuery(self.target)
+            self.pending[(view, object)] = name
+        glPopClientAttrib()
+        glPopAttrib()
+    
+    def collect(self):
+        """Read the results of the pending queries that are available."""
+        for (key, name) in self.pending.items():
+            if not glGetQueryObjectiv(name, GL_QUERY_RESULT_AVAILABLE):
+                continue
+            if glGetQueryObjectuiv(name, GL_QUERY_RESULT):
+                self.hidden.discard(key)
+            else:
+                self.hidden.add(key)
+            del self.pending[key]
+            self.free.append(name)
+    
+    def forget(self, object):
+        """Drop the results (and pending queries) of an object that has left
+        the scene.
+        
+        """
+        for key in [key for key in self.pending if key[1] is object]:
+            self.free.append(self.pending.pop(key))
+        self.hidden = set(key for key in self.hidden if key[1] is not object)
 
-class GLObject(object):
+class GLObject(Stationary):
     """Encapsulates various properties shared by OpenGL renderables."""
     def __init__(self,
                  translation,
@@ -39,26 +355,68 @@ class GLObject(object):
         self.specular = specular
         self.emissive = emissive
         self.shininess = shininess
+        #built once; it shares the property lists, so changes to them show
+        self.properties = models.Material(ambient, diffuse, specular,
+                emissive, shininess)
+        self.applyTexture = False
+        self.texture = None
+        self.region = (0.0, 0.0, 1.0, 1.0) #(s0, t0, s1, t1) of self.texture
+        self.volume = None #Bounds in model space; None is never culled
+        self.occluder = True #may be drawn first to hide what is behind it
+        self.drawnLate = False #queued after the opaque draws (see RenderQueue)
+    
+    def scene_bounds(self):
+        """Return this GLObject's Bounds in the space it is drawn in (or
+        None if it has none).
+        
+        """
+        if self.volume is None:
+            return None
+        return self.volume.transformed(self.translation, self.rotation,
+                self.scale)
+    
+    def material(self):
+        """Return this GLObject's material properties as a Material."""
+        return self.properties
+    
+    def texture_name(self):
+        """Return the 2D texture this GLObject is drawn with, or None."""
+        return self.texture if self.applyTexture else None
     
     def draw(self):
         """Apply properties and call render(), which draws the shapes."""
         glPushAttrib(GL_LIGHTING_BIT)
+        self.material().activate()
+        texture = self.texture_name()
+        if texture is not None:
+            render_queue.bind_texture(texture)
+        self.draw_geometry()
+        if texture is not None:
+            render_queue.bind_texture(None)
+        glPopAttrib()
+    
+    def submit(self, queue):
+        """Queue draw_geometry() under this GLObject's material and texture."""
+        queue.submit(self.draw_geometry, self.material(), self.texture_name(),
+                position=self.translation, late=self.drawnLate)
+    
+    def draw_geometry(self):
+        """Transform and call render(), under the current material."""
         glPushMatrix()
-        glMaterialfv(GL_FRONT, GL_AMBIENT,  self.ambient)
-        glMaterialfv(GL_FRONT, GL_DIFFUSE,  self.diffuse)
-        glMaterialfv(GL_FRONT, GL_SPECULAR, self.specular)
-        glMaterialfv(GL_FRONT, GL_EMISSION, self.emissive)
-        
-        glMaterialf(GL_FRONT, GL_SHININESS, self.shininess)
-        
         glTranslatef(*self.translation) #translate
         glMultMatrixf(self.rotation)    #rotate
         glScalef(*self.scale)           #scale
-        
         self.render()
-        
         glPopMatrix()
-        glPopAttrib()
+    
+    def tex_coord(self, s, t):
+        """Set a texture coordinate, clamped to [0, 1] and mapped into this
+        GLObject's region of its texture.
+        
+        """
+        (s0, t0, s1, t1) = self.region
+        glTexCoord2f(s0 + (s1 - s0) * min(max(s, 0.0), 1.0),
+                     t0 + (t1 - t0) * min(max(t, 0.0), 1.0))
     
     def render(self):
         """Override this method to render your GLObject."""
@@ -91,25 +449,47 @@ class GLMobileObject(object):
         self.specular = specular
         self.emissive = emissive
         self.shininess = shininess
+        #built once; it shares the property lists, so changes to them show
+        self.properties = models.Material(ambient, diffuse, specular,
+                emissive, shininess)
+        self.volume = None #Bounds in model space; None is never culled
+        self.occluder = True #may be drawn first to hide what is behind it
+        self.drawnLate = False #queued after the opaque draws (see RenderQueue)
+    
+    def scene_bounds(self):
+        """Return this GLMobileObject's Bounds where it is now (or None if it
+        has none).
+        
+        """
+        if self.volume is None:
+            return None
+        return self.volume.transformed(self.translation, self.rotation,
+                self.scale)
+    
+    def material(self):
+        """Return this GLMobileObject's material properties as a Material."""
+        return self.properties
     
     def draw(self):
         """Apply properties and call render(), which draws the shapes."""
         glPushAttrib(GL_LIGHTING_BIT)
+        self.material().activate()
+        self.draw_geometry()
+        glPopAttrib()
+    
+    def submit(self, queue):
+        """Queue draw_geometry() under this GLMobileObject's material."""
+        queue.submit(self.draw_geometry, self.material(),
+                position=self.translation, late=self.drawnLate)
+    
+    def draw_geometry(self):
+        """Transform and call render(), under the current material."""
         glPushMatrix()
-        glMaterialfv(GL_FRONT, GL_AMBIENT,  self.ambient)
-        glMaterialfv(GL_FRONT, GL_DIFFUSE,  self.diffuse)
-        glMaterialfv(GL_FRONT, GL_SPECULAR, self.specular)
-        glMaterialfv(GL_FRONT, GL_EMISSION, self.emissive)
-        glMaterialf(GL_FRONT, GL_SHININESS, self.shininess)
-        
         glTranslatef(*self.translation)    #translate
         glMultMatrixf(self.rotation) #rotate
         glScalef(*self.scale)              #scale
-        
         self.render()
-        
         glPopMatrix()
-        glPopAttrib()
         
     def move(self):
         """Advance position according to current attitude and return position
@@ -146,6 +526,9 @@ class PlasmaBolts(GLMobileObject):
                 emissive,
                 shininess)
         self.length = 5
+        self.drawnLate = True #emissive, and too thin to hide much
+        #the two cones, as render() places them
+        self.volume = Bounds([0.0, -0.5, -0.8], [self.length, 0.5, -0.6])
     
     def render(self):
         """Draw this PlasmaBolts as a pair of cones."""
@@ -176,6 +559,8 @@ class ParticleField(GLObject):
         """Constructor"""
         super(ParticleField, self).__init__(translation, rotation, scale,
                 ambient, diffuse, specular, emissive, shininess)
+        self.occluder = False #points hide next to nothing
+        self.drawnLate = True
         self.build(mu, sigma, n)
     
     def build(self, mu, sigma, n):
@@ -185,6 +570,9 @@ class ParticleField(GLObject):
         random.seed()
         d = lambda: random.normalvariate(mu, sigma)
         field = [(d(), d(), d()) for x in xrange(n)]
+        points = numpy.array(field).reshape(-1, 3)
+        if len(points):
+            self.volume = Bounds(points.min(axis=0), points.max(axis=0))
         
         #create call list for better performance
         self.callList = glGenLists(1)
@@ -202,27 +590,307 @@ class ParticleField(GLObject):
         glCallList(self.callList)
 
 
-class Asteroid(object):
+class Asteroid(Stationary):
     """A (real) asteroid loaded from .obj and .mtl files."""
     def __init__(self, name, translation=[0.0, 0.0, 0.0], scale=[1.0, 1.0, 1.0]):
         """Constructor"""
         super(Asteroid, self).__init__()
+        self.name = name
         self.translation = translation
         self.scale = scale
-        self.model = library.models[name]
+        self.levels = {} #view -> level of detail last drawn
+        self.volume = None #Bounds in model space, once its model is compiled
+        self.occluder = True #may be drawn first to hide what is behind it
+        self.bounds = None #(translation, scale, Bounds) of scene_bounds()
+    
+    def scene_bounds(self):
+        """Return this Asteroid's Bounds in the scene (or None if its model has
+        not been compiled).
+        
+        """
+        if self.volume is None:
+            if self.name not in library.bounds:
+                return None
+            (center, radius, lower, upper) = library.bounds[self.name]
+            self.volume = Bounds(lower, upper, center, radius)
+        (translation, scale) = (tuple(self.translation), tuple(self.scale))
+        if self.bounds is None or self.bounds[0:2] != (translation, scale):
+            self.bounds = (translation, scale, self.volume.transformed(
+                    translation, None, scale))
+        return self.bounds[2]
     
     def draw(self):
-        """Draw this Asteroid using a call list."""
+        """Draw this Asteroid from its model's buffer objects, at the level
+        of detail that suits its size on screen.
+        
+        """
         glPushAttrib(GL_LIGHTING_BIT)
         glPushMatrix()
         glTranslatef(*self.translation)
         glScalef(*self.scale)
-        glCallList(self.model)
+        model = library.acquire(self.name)
+        model.draw(self.choose_level(model))
         glPopMatrix()
         glPopAttrib()
+    
+    def submit(self, queue):
+        """Queue each Mesh of this Asteroid's level of detail (or gather it for
+        instanced drawing, where supported).
+        
+        """
+        if instancing.init():
+            asteroids.add(self)
+            return
+        model = library.acquire(self.name)
+        level = self.choose_level(model)
+        for mesh in model.levels[level]:
+            queue.submit(functools.partial(self.draw_mesh, model, mesh),
+                    mesh.material, buffers=model, position=self.translation)
+    
+    def choose_level(self, model):
+        """Choose (and count the triangles of) the level of detail to draw
+        in the current view, from the model's bounding sphere in the scene.
+        
+        """
+        center = [offset + size * middle for (offset, size, middle)
+                  in zip(self.translation, self.scale, model.center)]
+        radius = model.radius * max(abs(size) for size in self.scale)
+        level = model.choose_level(projected_radius(center, radius),
+                self.levels.get(view))
+        self.levels[view] = level
+        statistics['triangles'] += model.triangles(level)
+        statistics['fullTriangles'] += model.triangles()
+        return level
+    
+    def draw_mesh(self, model, mesh):
+        """Draw a Mesh of model (bound by the caller) in place."""
+        glPushMatrix()
+        glTranslatef(*self.translation)
+        glScalef(*self.scale)
+        model.draw_mesh(mesh)
+        glPopMatrix()
+
+
+class AsteroidInstances(object):
+    """Asteroids submitted for instanced drawing, queued as one draw per Mesh
+    of each model's level of detail.
+    
+    """
+    def __init__(self):
+        """Constructor"""
+        super(AsteroidInstances, self).__init__()
+        self.asteroids = collections.defaultdict(list) #model name -> Asteroids
+        self.batches = {} #(model name, level) -> instancing.InstanceBatch
+    
+    def add(self, asteroid):
+        """Gather an Asteroid, to be drawn at the next submit()."""
+        self.asteroids[asteroid.name].append(asteroid)
+    
+    def submit(self, queue):
+        """Choose the gathered Asteroids' levels of detail, upload their
+        instances and queue their meshes.
+        
+        """
+        for (name, asteroids) in self.asteroids.items():
+            model = library.acquire(name)
+            translations = numpy.array([asteroid.translation
+                    for asteroid in asteroids], numpy.float64)
+            scales = numpy.array([asteroid.scale for asteroid in asteroids],
+                    numpy.float64)
+            pixels = projected_radii(
+                    translations + scales * numpy.array(model.center),
+                    model.radius * numpy.abs(scales).max(axis=1))
+            levels = collections.defaultdict(list) #level -> asteroid indices
+            for (index, asteroid) in enumerate(asteroids):
+                level = model.choose_level(pixels[index],
+                        asteroid.levels.get(view))
+                asteroid.levels[view] = level
+                levels[level].append(index)
+            for (level, indices) in levels.items():
+                statistics['triangles'] += model.triangles(level) * len(indices)
+                statistics['fullTriangles'] += model.triangles() * len(indices)
+                batch = self.batches.get((name, level))
+                if batch is None:
+                    batch = self.batches[(name, level)] = \
+                            instancing.InstanceBatch()
+                batch.update(model, numpy.hstack((translations[indices],
+                        scales[indices])).astype(numpy.float32))
+                position = translations[indices].mean(axis=0).tolist()
+                for mesh in model.levels[level]:
+                    queue.submit(functools.partial(batch.draw_mesh, mesh),
+                            mesh.material, buffers=batch, position=position)
+        self.asteroids.clear()
+
+
+class Geometry(object):
+    """Interleaved vertex and index data of a primitive shape, drawn from
+    buffer objects in a single call.
+    
+    """
+    def __init__(self, positions, normals, texCoords, triangles):
+        """Constructor"""
+        super(Geometry, self).__init__()
+        self.vertexData = numpy.hstack((positions, normals,
+                texCoords)).astype(numpy.float32)
+        self.indexData = numpy.asarray(triangles).ravel().astype(numpy.uint32)
+        self.vertexBuffer = None
+        self.indexBuffer = None
+    
+    def upload(self):
+        """Copy this Geometry's vertex and index data into buffer objects."""
+        (self.vertexBuffer, self.indexBuffer) = glGenBuffers(2)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertexBuffer)
+        glBufferData(GL_ARRAY_BUFFER, self.vertexData.nbytes, self.vertexData,
+                GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.indexBuffer)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indexData.nbytes,
+                self.indexData, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+    
+    def bind(self):
+        """Bind (uploading, the first time) this Geometry's buffer objects and
+        point the vertex, normal and texture coordinate arrays into them.
+        
+        """
+        if self.vertexBuffer is None:
+            self.upload()
+        stride = self.vertexData.strides[0]
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertexBuffer)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.indexBuffer)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glVertexPointer(3, GL_FLOAT, stride, ctypes.c_void_p(0))
+        glNormalPointer(GL_FLOAT, stride, ctypes.c_void_p(12))
+        glTexCoordPointer(2, GL_FLOAT, stride, ctypes.c_void_p(24))
+    
+    def unbind(self):
+        """Undo bind()."""
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+    
+    def draw(self):
+        """Draw this Geometry's triangles (with it bound)."""
+        glDrawElements(GL_TRIANGLES, len(self.indexData), GL_UNSIGNED_INT,
+                ctypes.c_void_p(0))
+
+
+def shared_geometry(key, build):
+    """Return the Geometry shared by every primitive with the given key
+    (type and parameters), calling build() to generate it the first time.
+    
+    """
+    if key not in geometries:
+        geometries[key] = build()
+    return geometries[key]
+
+def strip_triangles(strip):
+    """Return the triangles of a triangle strip (a sequence of vertex
+    indices), wound as OpenGL winds them.
+    
+    """
+    strip = numpy.asarray(strip)
+    triangles = numpy.column_stack((strip[:-2], strip[1:-1], strip[2:]))
+    triangles[1::2, 0:2] = triangles[1::2][:, [1, 0]]
+    return triangles
+
+def quad_triangles(quads):
+    """Return the triangles (two per row) of quads, rows of 4 indices."""
+    quads = numpy.asarray(quads).reshape(-1, 4)
+    return numpy.vstack((quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]))
+
+def grid_quads(rows, columns, corners):
+    """Return the quads of a grid of (rows + 1) by (columns + 1) vertices,
+    indexed row by row, each with the given (row, column) offsets as corners.
+    
+    """
+    (row, column) = numpy.mgrid[0:rows, 0:columns]
+    base = (row * (columns + 1) + column).reshape(-1, 1)
+    offsets = [r * (columns + 1) + c for (r, c) in corners]
+    return base + numpy.array(offsets)
+
+
+class Primitive(GLObject):
+    """A GLObject whose shape is a Geometry shared with every other Primitive
+    of the same type and parameters.
+    
+    """
+    adaptive = False
+    
+    def choose_segments(self):
+        """Choose n (if this Primitive is adaptive) from the projected radius
+        of its scene_bounds() in the current view, per view.
+        
+        """
+        if self.adaptive:
+            bounds = self.scene_bounds()
+            self.n = choose_segments(projected_radius(bounds.center,
+                    bounds.radius), self.levels.get(view))
+            self.levels[view] = self.n
+    
+    def geometry(self):
+        """Override this method to return your Primitive's shared Geometry."""
+        raise NotImplementedError('%s has not yet been implemented' % __name__)
+    
+    def submit(self, queue):
+        """Queue draw_geometry() under this Primitive's material and texture,
+        with its Geometry as the buffers, so instances share one binding.
+        
+        """
+        self.choose_segments()
+        queue.submit(functools.partial(self.draw_geometry, True),
+                self.material(), self.texture_name(), buffers=self.geometry(),
+                position=self.translation)
+    
+    def draw_geometry(self, bound=False):
+        """Transform and draw this Primitive; bound says whether its Geometry
+        is bound already.
+        
+        """
+        glPushMatrix()
+        glTranslatef(*self.translation) #translate
+        glMultMatrixf(self.rotation)    #rotate
+        glScalef(*self.scale)           #scale
+        if bound:
+            self.render_bound()
+        else:
+            self.choose_segments()
+            self.render()
+        glPopMatrix()
+    
+    def render(self):
+        """Bind and draw this Primitive's Geometry."""
+        geometry = self.geometry()
+        geometry.bind()
+        self.render_bound()
+        geometry.unbind()
+    
+    def render_bound(self):
+        """Draw this Primitive's (bound) Geometry, mapping its texture
+        coordinates into its region.
+        
+        """
+        (s0, t0, s1, t1) = self.region
+        mapped = self.applyTexture and self.region != (0.0, 0.0, 1.0, 1.0)
+        if mapped:
+            glMatrixMode(GL_TEXTURE)
+            glPushMatrix()
+            glLoadIdentity()
+            glTranslatef(s0, t0, 0.0)
+            glScalef(s1 - s0, t1 - t0, 1.0)
+            glMatrixMode(GL_MODELVIEW)
+        self.geometry().draw()
+        if mapped:
+            glMatrixMode(GL_TEXTURE)
+            glPopMatrix()
+            glMatrixMode(GL_MODELVIEW)
 
 
-class Sphere(GLObject):
+class Sphere(Primitive):
     """Texture-ready Sphere, courtesy of Paul Bourke (ported from C):
       http://paulbourke.net/texture_colour/texturemap/
     
@@ -242,7 +910,9 @@ class Sphere(GLObject):
                  diffuse=[ 1.0, 1.0, 1.0],
                  specular=[1.0, 1.0, 1.0],
                  emissive=[0.0, 0.0, 0.0],
-                 shininess=5.0):
+                 shininess=5.0,
+                 region=(0.0, 0.0, 1.0, 1.0),
+                 n=None):
         """Constructor"""
         super(Sphere, self).__init__(translation, rotation, scale,
                 ambient, diffuse, specular, emissive, shininess)
@@ -250,73 +920,58 @@ class Sphere(GLObject):
         self.theta = theta
         self.center = [0.0, 0.0, 0.0]
         self.radius = 1.0
-        self.n = 32
+        self.volume = Bounds(numpy.subtract(self.center, self.radius),
+                numpy.add(self.center, self.radius), self.center, self.radius)
+        self.n = n or 32 #segments around (n of None adapts to the screen)
+        self.adaptive = n is None
+        self.levels = {} #view -> segments last drawn
         self.applyTexture = applyTexture
         self.texture = texture
+        self.region = region
+    
+    def geometry(self):
+        """Return the Geometry of this Sphere, in whole or in part, based on
+        phi/theta.
         
-    def render(self):
-        """Render this Sphere in whole or in part, based on phi/theta."""
-        if not self.phi or not self.theta:
-            self.render_complete()
+        """
+        return shared_geometry(('sphere', self.n, tuple(self.phi),
+                tuple(self.theta), tuple(self.center), self.radius), self.build)
+    
+    def build(self):
+        """Generate this Sphere as a grid of n/2 + 1 rows by n + 1 columns."""
+        rows = self.n / 2
+        complete = not self.phi or not self.theta
+        if complete:
+            (phi, theta) = ([-math.pi / 2, math.pi / 2], [0.0, 2 * math.pi])
         else:
-            self.render_partial(self.phi, self.theta)
-    
-    def render_complete(self):
-        """Render this Sphere as a series of triangle strips."""
-        if self.applyTexture and self.texture is not None:
-            glEnable(GL_TEXTURE_2D)
-            glBindTexture(GL_TEXTURE_2D, self.texture)
-            glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_MODULATE)
-        for j in range(self.n / 2):
-            theta = [j      * 2 * math.pi / self.n - (math.pi / 2),
-                    (j + 1) * 2 * math.pi / self.n - (math.pi / 2),
-                    0.0]
-            glBegin(GL_TRIANGLE_STRIP)
-            for i in range(self.n + 1):
-                theta[2] = i * 2 * math.pi / self.n
-                self.set_point(theta[1], theta[2], i, j + 1)
-                self.set_point(theta[0], theta[2], i, j)
-            glEnd()
-        if self.applyTexture:
-            glDisable(GL_TEXTURE_2D)
-    
-    def render_partial(self, phi, theta):
-        """Render a portion of this Sphere as a series of triangle strips."""
-        if self.applyTexture and self.texture is not None:
-            glEnable(GL_TEXTURE_2D)
-            glBindTexture(GL_TEXTURE_2D, self.texture)
-            glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_MODULATE)
-        for j in range(self.n / 2):
-            t1 = phi[0] +  j      * (phi[1] - phi[0]) / (self.n / 2)
-            t2 = phi[0] + (j + 1) * (phi[1] - phi[0]) / (self.n / 2)
-            
-            glBegin(GL_TRIANGLE_STRIP)
-            for i in range(self.n + 1):
-                t3 = theta[0] + i * (theta[1] - theta[0]) / self.n
-                self.set_point(t1, t3, i, j)
-                self.set_point(t2, t3, i, j + 1)
-            glEnd()
-        if self.applyTexture:
-            glDisable(GL_TEXTURE_2D)
-    
-    def set_point(self, t0, t1, x, y):
-        """Calculate a vertex and normal from t0, t1, x, and y; use them to
-        to set glNormal, glTexCoord, and glVertex."""
-        normal = [math.cos(t0) * math.cos(t1),
-                  math.sin(t0),
-                  math.cos(t0) * math.sin(t1)]
-        vertex = [self.center[0] + self.radius * normal[0],
-                  self.center[1] + self.radius * normal[1],
-                  self.center[2] + self.radius * normal[2]]
-        glNormal3f(*normal)
-        glTexCoord2f(x / float(self.n), 2 * y / float(self.n))
-        glVertex3f(*vertex)
-
-
-class Cylinder(GLObject):
+            (phi, theta) = (self.phi, self.theta)
+        (t1, t0) = numpy.meshgrid(
+                numpy.linspace(theta[0], theta[1], self.n + 1),
+                numpy.linspace(phi[0], phi[1], rows + 1))
+        (x, y) = numpy.meshgrid(numpy.arange(self.n + 1),
+                numpy.arange(rows + 1))
+        normals = numpy.column_stack((
+                (numpy.cos(t0) * numpy.cos(t1)).ravel(),
+                numpy.sin(t0).ravel(),
+                (numpy.cos(t0) * numpy.sin(t1)).ravel()))
+        positions = numpy.array(self.center) + self.radius * normals
+        texCoords = numpy.column_stack((x.ravel() / float(self.n),
+                2 * y.ravel() / float(self.n))).clip(0.0, 1.0)
+        triangles = []
+        for j in range(rows):
+            (lower, upper) = (y == j, y == j + 1)
+            #complete spheres strip upward from each row, partial downward
+            first = (upper if complete else lower).ravel().nonzero()[0]
+            second = (lower if complete else upper).ravel().nonzero()[0]
+            triangles.append(strip_triangles(
+                    numpy.column_stack((first, second)).ravel()))
+        return Geometry(positions, normals, texCoords, numpy.vstack(triangles))
+
+
+class Cylinder(Primitive):
     """Texture-ready cube."""
     def __init__(self,
-                 n=8,
+                 n=None,
                  renderTop=True,
                  renderBottom=True,
                  applyTexture=False,
@@ -331,7 +986,8 @@ class Cylinder(GLObject):
                  diffuse=[ 1.0, 1.0, 1.0],
                  specular=[1.0, 1.0, 1.0],
                  emissive=[0.0, 0.0, 0.0],
-                 shininess=5.0):
+                 shininess=5.0,
+                 region=(0.0, 0.0, 1.0, 1.0)):
         """Constructor"""
         super(Cylinder, self).__init__(translation, rotation, scale,
                 ambient, diffuse, specular, emissive, shininess)
@@ -339,55 +995,57 @@ class Cylinder(GLObject):
         self.renderBottom = renderBottom
         self.applyTexture = applyTexture
         self.texture = texture
-        self.n = 16
+        self.region = region
+        self.volume = Bounds([-1.0, -1.0, -1.0], [1.0, 1.0, 1.0],
+                radius=math.sqrt(2.0))
+        self.n = n or 16 #segments around (n of None adapts to the screen)
+        self.adaptive = n is None
+        self.levels = {} #view -> segments last drawn
     
-    def render(self):
-        """Render this cube as a series of quads."""
-        if self.applyTexture and self.texture is not None:
-            glEnable(GL_TEXTURE_2D)
-            glBindTexture(GL_TEXTURE_2D, self.texture)
-            glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_MODULATE)
+    def geometry(self):
+        """Return the Geometry of this Cylinder, with or without its ends."""
+        return shared_geometry(('cylinder', self.n, self.renderTop,
+                self.renderBottom), self.build)
+    
+    def build(self):
+        """Generate this Cylinder's side (n quads) and ends (n-triangle fans)
+        between z = -1 and z = 1.
         
-        glPushMatrix()
+        """
+        th = numpy.radians(numpy.arange(self.n + 1) * 360.0 / self.n)
+        (cth, sth) = (numpy.cos(th), numpy.sin(th))
+        zeros = numpy.zeros(self.n + 1)
+        ones = numpy.ones(self.n + 1)
+        #side: a column of (top, bottom) vertices per angle
+        positions = [numpy.column_stack((cth, sth, ones)),
+                     numpy.column_stack((cth, sth, -ones))]
+        normals = [numpy.column_stack((cth, sth, zeros))] * 2
+        texCoords = [numpy.column_stack((zeros, th / (math.pi / 2))),
+                     numpy.column_stack((2 * ones, th / (math.pi / 2)))]
+        column = numpy.arange(self.n)
+        bottom = self.n + 1
+        triangles = [quad_triangles(numpy.column_stack((column, bottom + column,
+                bottom + column + 1, column + 1)))]
         
         ends = []
         if self.renderBottom:
             ends.append(-1)
         if self.renderTop:
             ends.append(1)
-        
         for j in ends:
-            glNormal3d(0, 0, j)
-            glBegin(GL_TRIANGLE_FAN)
-            glTexCoord2d(0, 0); glVertex3d(0, 0, j)
-            for i in range(self.n + 1):
-                th = j * i * 360.0 / self.n
-                cth = math.cos(math.radians(th))
-                sth = math.sin(math.radians(th))
-                glTexCoord2d(cth, sth); glVertex3d(cth, sth, j)
-            glEnd()
-        
-        glBegin(GL_QUADS)
-        for i in range(self.n):
-            th0 =  i    * 360.0 / self.n
-            th1 = (i+1) * 360.0 / self.n
-            cth0 = math.cos(math.radians(th0))
-            sth0 = math.sin(math.radians(th0))
-            cth1 = math.cos(math.radians(th1))
-            sth1 = math.sin(math.radians(th1))
-            glNormal3d(cth0, sth0, 0); glTexCoord2d(0, th0 / 90.0); glVertex3d(cth0, sth0,  1)
-            glNormal3d(cth0, sth0, 0); glTexCoord2d(2, th0 / 90.0); glVertex3d(cth0, sth0, -1)
-            glNormal3d(cth1, sth1, 0); glTexCoord2d(2, th1 / 90.0); glVertex3d(cth1, sth1, -1)
-            glNormal3d(cth1, sth1, 0); glTexCoord2d(0, th1 / 90.0); glVertex3d(cth1, sth1,  1)
-        glEnd()
-        glPopMatrix()
-        
-        if self.applyTexture:
-            glBindTexture(GL_TEXTURE_2D, 0)
-            glDisable(GL_TEXTURE_2D)
+            first = sum(len(p) for p in positions)
+            (c, s) = (numpy.cos(j * th), numpy.sin(j * th))
+            positions.append(numpy.vstack(([0, 0, j],
+                    numpy.column_stack((c, s, j * ones)))))
+            normals.append(numpy.tile([0, 0, j], (self.n + 2, 1)))
+            texCoords.append(numpy.vstack(([0, 0], numpy.column_stack((c, s)))))
+            triangles.append(first + numpy.column_stack((
+                    numpy.zeros(self.n, int), column + 1, column + 2)))
+        return Geometry(numpy.vstack(positions), numpy.vstack(normals),
+                numpy.vstack(texCoords).clip(0.0, 1.0), numpy.vstack(triangles))
 
 
-class Cube(GLObject):
+class Cube(Primitive):
     """Texture-ready cube."""
     def __init__(self,
                  applyTexture=False,
@@ -402,69 +1060,42 @@ class Cube(GLObject):
                  diffuse=[ 1.0, 1.0, 1.0],
                  specular=[1.0, 1.0, 1.0],
                  emissive=[0.0, 0.0, 0.0],
-                 shininess=5.0):
+                 shininess=5.0,
+                 region=(0.0, 0.0, 1.0, 1.0)):
         """Constructor"""
         super(Cube, self).__init__(translation, rotation, scale,
                 ambient, diffuse, specular, emissive, shininess)
         self.applyTexture = applyTexture
         self.texture = texture
+        self.region = region
+        self.volume = Bounds([-1.0, -1.0, -1.0], [1.0, 1.0, 1.0])
     
-    def render(self):
-        """Render this cube as a series of quads."""
-        if self.applyTexture and self.texture is not None:
-            glEnable(GL_TEXTURE_2D)
-            glBindTexture(GL_TEXTURE_2D, self.texture)
-            glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_MODULATE)
-        
-        glBegin(GL_QUADS)
-        #  Front
-        glNormal3f(0, 0, 1)
-        glTexCoord2f(0, 0); glVertex3f(-1, -1, 1)
-        glTexCoord2f(1, 0); glVertex3f( 1, -1, 1)
-        glTexCoord2f(1, 1); glVertex3f( 1,  1, 1)
-        glTexCoord2f(0, 1); glVertex3f(-1,  1, 1)
-        #  Back
-        glNormal3f(0, 0, -1)
-        glTexCoord2f(0, 0); glVertex3f( 1, -1, -1)
-        glTexCoord2f(1, 0); glVertex3f(-1, -1, -1)
-        glTexCoord2f(1, 1); glVertex3f(-1,  1, -1)
-        glTexCoord2f(0, 1); glVertex3f( 1,  1, -1)
-        #  Right
-        glNormal3f(1, 0, 0)
-        glTexCoord2f(0, 0); glVertex3f( 1, -1,  1)
-        glTexCoord2f(1, 0); glVertex3f( 1, -1, -1)
-        glTexCoord2f(1, 1); glVertex3f( 1,  1, -1)
-        glTexCoord2f(0, 1); glVertex3f( 1,  1,  1)
-        #  Left
-        glNormal3f(-1, 0, 0)
-        glTexCoord2f(0, 0); glVertex3f(-1, -1, -1)
-        glTexCoord2f(1, 0); glVertex3f(-1, -1,  1)
-        glTexCoord2f(1, 1); glVertex3f(-1,  1,  1)
-        glTexCoord2f(0, 1); glVertex3f(-1,  1, -1)
-        #  Top
-        glNormal3f(0, 1, 0)
-        glTexCoord2f(0, 0); glVertex3f(-1,  1,  1)
-        glTexCoord2f(1, 0); glVertex3f( 1,  1,  1)
-        glTexCoord2f(1, 1); glVertex3f( 1,  1, -1)
-        glTexCoord2f(0, 1); glVertex3f(-1,  1, -1)
-        #  Bottom
-        glNormal3f(0, -1, 0)
-        glTexCoord2f(0, 0); glVertex3f(-1, -1, -1)
-        glTexCoord2f(1, 0); glVertex3f( 1, -1, -1)
-        glTexCoord2f(1, 1); glVertex3f( 1, -1,  1)
-        glTexCoord2f(0, 1); glVertex3f(-1, -1,  1)
-        glEnd()
-        
-        if self.applyTexture:
-            glBindTexture(GL_TEXTURE_2D, 0)
-            glDisable(GL_TEXTURE_2D)
+    def geometry(self):
+        """Return the Geometry of this cube."""
+        return shared_geometry(('cube',), self.build)
+    
+    def build(self):
+        """Generate this cube as a series of quads, 4 vertices per face."""
+        positions = [
+            [-1, -1,  1], [ 1, -1,  1], [ 1,  1,  1], [-1,  1,  1], #front
+            [ 1, -1, -1], [-1, -1, -1], [-1,  1, -1], [ 1,  1, -1], #back
+            [ 1, -1,  1], [ 1, -1, -1], [ 1,  1, -1], [ 1,  1,  1], #right
+            [-1, -1, -1], [-1, -1,  1], [-1,  1,  1], [-1,  1, -1], #left
+            [-1,  1,  1], [ 1,  1,  1], [ 1,  1, -1], [-1,  1, -1], #top
+            [-1, -1, -1], [ 1, -1, -1], [ 1, -1,  1], [-1, -1,  1]  #bottom
+        ]
+        normals = numpy.repeat([[0, 0, 1], [0, 0, -1], [1, 0, 0], [-1, 0, 0],
+                [0, 1, 0], [0, -1, 0]], 4, axis=0)
+        texCoords = numpy.tile([[0, 0], [1, 0], [1, 1], [0, 1]], (6, 1))
+        return Geometry(positions, normals, texCoords,
+                quad_triangles(numpy.arange(24)))
 
 
-class Torus(GLObject):
+class Torus(Primitive):
     """Texture-ready cube."""
     def __init__(self,
                  thickness=1.0,
-                 n=8,
+                 n=None,
                  applyTexture=False,
                  texture=None,
                  translation=[0.0, 0.0, 0.0],
@@ -477,48 +1108,44 @@ class Torus(GLObject):
                  diffuse=[ 1.0, 1.0, 1.0],
                  specular=[1.0, 1.0, 1.0],
                  emissive=[0.0, 0.0, 0.0],
-                 shininess=5.0):
+                 shininess=5.0,
+                 region=(0.0, 0.0, 1.0, 1.0)):
         """Constructor"""
         super(Torus, self).__init__(translation, rotation, scale,
                 ambient, diffuse, specular, emissive, shininess)
         self.applyTexture = applyTexture
         self.texture = texture
-        self.n = n
+        self.region = region
+        self.n = n or 8 #segments around (n of None adapts to the screen)
+        self.adaptive = n is None
+        self.levels = {} #view -> segments last drawn
         self.thickness = thickness
+        r = 1.0 + thickness
+        self.volume = Bounds([-r, -r, -thickness], [r, r, thickness], radius=r)
     
-    def render(self):
-        """Render this cube as a series of quads."""
-        if self.applyTexture and self.texture is not None:
-            glEnable(GL_TEXTURE_2D)
-            glBindTexture(GL_TEXTURE_2D, self.texture)
-            glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_MODULATE)
+    def geometry(self):
+        """Return the Geometry of this Torus."""
+        return shared_geometry(('torus', self.n, self.thickness), self.build)
+    
+    def build(self):
+        """Generate this Torus as a grid of quads: n around the ring (th) by
+        n around the tube (ph).
         
-        glBegin(GL_QUADS)
+        """
         r = self.thickness
-        for i in range(self.n):
-            th0 =  i      * 360.0 / self.n
-            th1 = (i + 1) * 360.0 / self.n
-            #loop around ring
-            for j in range(self.n):
-                ph0 =  j      * 360.0 / self.n
-                ph1 = (j + 1) * 360.0 / self.n
-                cth0 = math.cos(math.radians(th0))
-                cth1 = math.cos(math.radians(th1))
-                cph0 = math.cos(math.radians(ph0))
-                cph1 = math.cos(math.radians(ph1))
-                sth0 = math.sin(math.radians(th0))
-                sth1 = math.sin(math.radians(th1))
-                sph0 = math.sin(math.radians(ph0))
-                sph1 = math.sin(math.radians(ph1))
-                glNormal3d(cth1*cph0,-sth1*cph0,sph0); glTexCoord2d(th1/30.0,ph0/180.0); glVertex3d(cth1*(1+r*cph0),-sth1*(1+r*cph0),r*sph0)
-                glNormal3d(cth0*cph0,-sth0*cph0,sph0); glTexCoord2d(th0/30.0,ph0/180.0); glVertex3d(cth0*(1+r*cph0),-sth0*(1+r*cph0),r*sph0)
-                glNormal3d(cth0*cph1,-sth0*cph1,sph1); glTexCoord2d(th0/30.0,ph1/180.0); glVertex3d(cth0*(1+r*cph1),-sth0*(1+r*cph1),r*sph1)
-                glNormal3d(cth1*cph1,-sth1*cph1,sph1); glTexCoord2d(th1/30.0,ph1/180.0); glVertex3d(cth1*(1+r*cph1),-sth1*(1+r*cph1),r*sph1)
-        glEnd()
-        
-        if self.applyTexture:
-            glBindTexture(GL_TEXTURE_2D, 0)
-            glDisable(GL_TEXTURE_2D)
+        angles = numpy.arange(self.n + 1) * 360.0 / self.n
+        (th, ph) = numpy.meshgrid(angles, angles) #rows of ph, columns of th
+        (cth, sth) = (numpy.cos(numpy.radians(th)), numpy.sin(numpy.radians(th)))
+        (cph, sph) = (numpy.cos(numpy.radians(ph)), numpy.sin(numpy.radians(ph)))
+        normals = numpy.column_stack(((cth * cph).ravel(),
+                (-sth * cph).ravel(), sph.ravel()))
+        positions = numpy.column_stack(((cth * (1 + r * cph)).ravel(),
+                (-sth * (1 + r * cph)).ravel(), (r * sph).ravel()))
+        texCoords = numpy.column_stack(((th / 30.0).ravel(),
+                (ph / 180.0).ravel())).clip(0.0, 1.0)
+        #(th1, ph0), (th0, ph0), (th0, ph1), (th1, ph1)
+        quads = grid_quads(self.n, self.n, [(0, 1), (0, 0), (1, 0), (1, 1)])
+        return Geometry(positions, normals, texCoords, quad_triangles(quads))
 
 
 class Axes(GLObject):
@@ -554,4 +1181,4 @@ class Axes(GLObject):
         glEnd()
         for axis in self.axes.keys():
             util.print_to_scene(axis, position=self.axes[axis]) #label axis
-    
\ No newline at end of file
+    
@@ -0,0 +1,107 @@
+"""Instanced drawing of models: one call draws a Mesh at many places."""
+__author__ = "Micah Larson"
+__date__   = "$Oct 16, 2026 5:37:20 PM$"
+
+from OpenGL.GL import *   #@UnusedWildImport
+
+import ctypes
+import sys
+
+import shading
+
+#places each model space vertex by its instance's translation and scale, then
+#lights it as shading does; unless linked with shading's fragment shader too,
+#fragments are left to the fixed function
+VERTEX_SHADER = """
+#version 120
+attribute vec3 translation;
+attribute vec3 scale;
+""" + shading.LIGHTING + """
+void main()
+{
+    vec4 eye = gl_ModelViewMatrix * vec4(gl_Vertex.xyz * scale + translation,
+            1.0);
+    light_vertex(eye, normalize(gl_NormalMatrix * (gl_Normal / scale)));
+}
+"""
+programs = {} #shaded -> linked program; False if instancing is unsupported
+locations = {} #(shaded, attribute name) -> location in programs[shaded]
+
+def init(shaded=False):
+    """Link the instancing program (the first time) and return whether
+    instanced drawing is supported.
+    
+    """
+    if shaded in programs:
+        return bool(programs[shaded])
+    programs[shaded] = False
+    if not (bool(glDrawElementsInstanced) and bool(glVertexAttribDivisor)):
+        print >> sys.stderr, 'init> instanced drawing is not supported'
+        return False
+    try:
+        linked = shading.link(VERTEX_SHADER,
+                shading.FRAGMENT_SHADER if shaded else None)
+    except RuntimeError as error:
+        print >> sys.stderr, 'init> unable to build instancing: %s' % error
+        return False
+    shading.configure(linked)
+    for name in ('translation', 'scale'):
+        locations[(shaded, name)] = glGetAttribLocation(linked, name)
+    programs[shaded] = linked
+    return True
+
+
+class InstanceBatch(object):
+    """The places to draw a Model at: a buffer of per-instance attributes."""
+    def __init__(self):
+        """Constructor"""
+        super(InstanceBatch, self).__init__()
+        self.model = None
+        self.count = 0 #instances
+        self.shaded = False #whether bound with the shaded program
+        self.buffer = None
+    
+    def update(self, model, instances):
+        """Upload the instances (rows of translation and scale, as a float32
+        (n, 6) array) to draw model at.
+        
+        """
+        if self.buffer is None:
+            self.buffer = glGenBuffers(1)
+        self.model = model
+        self.count = len(instances)
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        glBufferData(GL_ARRAY_BUFFER, instances.nbytes, instances,
+                GL_STREAM_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+    
+    def bind(self):
+        """Bind the Model, the instancing program (shaded while shading is
+        active, if it can be) and the instance buffer, ready for draw_mesh().
+        
+        """
+        self.model.bind()
+        self.shaded = shading.active and init(True)
+        glUseProgram(programs[self.shaded])
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        for (name, offset) in (('translation', 0), ('scale', 12)):
+            location = locations[(self.shaded, name)]
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, 3, GL_FLOAT, GL_FALSE, 24,
+                    ctypes.c_void_p(offset))
+            glVertexAttribDivisor(location, 1)
+    
+    def unbind(self):
+        """Undo bind()."""
+        for name in ('translation', 'scale'):
+            location = locations[(self.shaded, name)]
+            glVertexAttribDivisor(location, 0)
+            glDisableVertexAttribArray(location)
+        shading.resume()
+        self.model.unbind()
+    
+    def draw_mesh(self, mesh):
+        """Draw a Mesh of the Model at every instance (with this bound)."""
+        offset = 3 * self.model.indexData.itemsize * mesh.first
+        glDrawElementsInstanced(GL_TRIANGLES, 3 * mesh.count, GL_UNSIGNED_INT,
+                ctypes.c_void_p(offset), self.count)
@@ -6,15 +6,46 @@ from OpenGL.GL import *   #@UnusedWildImport
 from OpenGL.GLU import *  #@UnusedWildImport
 from OpenGL.GLUT import * #@UnusedWildImport
 
+import collections
+import ctypes
+import heapq
+import math
+import multiprocessing
+import operator
+import re
+import time
+
+import numpy
+
+import cache
 import coordinates
 
 MODEL_PATH = os.path.join('..', 'etc', 'models') #assumes running from src
+VERTEX_CACHE_SIZE = 16 #entries in the (FIFO) post-transform vertex cache
+CHUNK_SIZE = 1 << 20 #bytes of .obj text read (and parsed) at a time
+CACHE_VERSION = 5 #increment whenever the cached arrays change meaning
+CREASE_ANGLE = 60.0 #degrees between faces that splits generated normals
+NORMAL_PAIRS = 1 << 22 #corner pairs compared at a time to split normals
+LOD_RATIO = 4     #each level of detail has 1/LOD_RATIO the last's triangles
+LOD_MINIMUM = 64  #fewest triangles worth a level of detail of its own
+LOD_PIXELS = 256  #projected radius (pixels) at which full detail is drawn
+LOD_HYSTERESIS = 0.25 #fraction of a level a size must pass to switch levels
+DOUBLE_SLASH = re.compile(r'/[^\s/]*/') #a face packet with two slashes
+BARE_INDEX = re.compile(r'(?<!\S)(-?\d+)(?!\S)') #a v face packet
+INDEX_PAIR = re.compile(r'(?<!\S)(-?\d+/-?\d+)(?!\S)') #a v/t face packet
 
 class ModelLibrary(object):
-    """Dictionary of models."""
-    def __init__(self):
+    """Dictionary of models, loaded and uploaded on demand and evicted least
+    recently drawn first to stay within a GPU memory budget.
+    
+    """
+    def __init__(self, rebuild=False, processes=None, budget=256 << 20):
         """Constructor"""
         super(ModelLibrary, self).__init__()
+        self.rebuild = rebuild #ignore (and overwrite) cached meshes
+        #number of worker processes that parse and build models
+        self.processes = processes or multiprocessing.cpu_count()
+        self.budget = budget #bytes of buffer memory models may use
         self.files = [
             'bacchus.obj',
             'castalia.obj',
@@ -24,27 +55,138 @@ class ModelLibrary(object):
             'ky26.obj',
             'toutatis.obj'
         ]
-        self.models = {}
+        self.models = {}   #name -> Model (uploaded)
+        self.entries = {}  #name -> mesh cache entry
+        self.bounds = {}   #name -> (center, radius, lower, upper), once compiled
+        self.resident = collections.OrderedDict() #name -> bytes, LRU first
+        self.residentBytes = 0
+        self.frame = 0     #advanced by next_frame()
+        self.lastFrame = {} #name -> frame in which it was last acquired
+        self.debug = False #print each model's loads and evictions
+
+    def init(self, names=None, compile=False):
+        """Check the cache entries of the named models (default: all of them)
+        in worker processes; models are parsed and uploaded when first drawn.
+        
+        """
+        files = [file for file in self.files
+                 if names is None or file.rsplit('.', 1)[0] in names]
+        processes = max(1, min(self.processes, len(files)))
+        print '%s> checking models (%d processes):' % (
+                self.__class__.__name__, processes)
+        start = time.time()
+        jobs = [(os.path.join(MODEL_PATH, file), self.rebuild, compile)
+                for file in files]
+        if processes > 1:
+            pool = multiprocessing.Pool(processes)
+            results = pool.imap_unordered(compile_model, jobs)
+        else:
+            pool = None
+            results = (compile_model(job) for job in jobs)
+        try:
+            for (path, entry, bounds, cached, seconds) in results:
+                name = os.path.basename(path).rsplit('.', 1)[0]
+                if entry is not None:
+                    self.entries[name] = entry
+                if bounds is not None:
+                    self.bounds[name] = bounds
+                print '  %s: %0.3f s %s' % (name, seconds, 'from cache'
+                        if cached else 'parsed' if compile else
+                        'stale (parsed when first drawn)')
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        print '  total: %0.3f s' % (time.time() - start)
+    
+    def acquire(self, name):
+        """Return the named Model, ready to draw, marking it most recently
+        drawn.  Loads and uploads it first if it is not resident.
+        
+        """
+        self.lastFrame[name] = self.frame
+        if name in self.resident:
+            self.resident[name] = self.resident.pop(name) #move to back
+            return self.models[name]
+        model = self.load(name)
+        self.models[name] = model
+        self.resident[name] = model.gpu_bytes()
+        self.residentBytes += self.resident[name]
+        while self.residentBytes > self.budget:
+            oldest = next(iter(self.resident))
+            if self.lastFrame[oldest] == self.frame:
+                break #the rest were acquired this frame, too
+            self.evict(oldest)
+        return model
+    
+    def next_frame(self):
+        """Start a new frame: models acquired before now may be evicted."""
+        self.frame += 1
+    
+    def load(self, name):
+        """Map the named model from its cache entry (compiling it here if it
+        has no fresh one) and upload it.
+        
+        """
+        path = os.path.join(MODEL_PATH, name + '.obj')
+        model = Model()
+        start = time.time()
+        entry = self.entries.get(name)
+        if entry is None or not model.load_cache(entry):
+            model.init(path, self.rebuild and name not in self.entries)
+            self.entries[name] = model.cacheEntry
+            self.bounds[name] = model.bounds()
+        mapped = time.time()
+        model.upload()
+        if self.debug:
+            print '%s> loaded %s: %0.3f s map; %0.3f s upload; %d KB' % (
+                    self.__class__.__name__, name, mapped - start,
+                    time.time() - mapped, model.gpu_bytes() >> 10)
+            print '    %d corners -> %d vertices; ACMR %0.3f -> %0.3f' % (
+                    3 * model.sizes[0][0], model.sizes[0][1], model.acmr[0],
+                    model.acmr[1])
+            print '    levels of detail: %s triangles' % ', '.join(
+                    str(triangles) for (triangles, vertices) in model.sizes)
+        return model
+    
+    def evict(self, name):
+        """Release the named model's buffers (it stays in the mesh cache)."""
+        self.residentBytes -= self.resident.pop(name)
+        self.models.pop(name).release()
+        if self.debug:
+            print '%s> evicted %s (%d KB resident)' % (
+                    self.__class__.__name__, name, self.residentBytes >> 10)
 
-    def init(self):
-        """Loads display lists into this class' dictionary."""
-        print '%s> loading models:' % self.__class__.__name__
-        for file in self.files:
-            name = file.rsplit('.', 1)[0]
-            model = Model()
-            print ' ', name
-            model.init(os.path.join(MODEL_PATH, file))
-            
-            glPushAttrib(GL_LIGHTING_BIT)
-            glPushMatrix()
-            callList = glGenLists(1)
-            glNewList(callList, GL_COMPILE)
-            model.draw()
-            glEndList()
-            glPopMatrix()
-            glPopAttrib()
-            
-            self.models[name] = callList
+def compile_model(job):
+    """Check (and, if stale and compile is set, rebuild) the cache entry of a
+    model in a worker process; returns (path, entry, bounds, cached, seconds).
+    
+    """
+    (path, rebuild, compile) = job
+    start = time.time()
+    name = os.path.basename(path).rsplit('.', 1)[0]
+    entry = cache.entry('models', name, cache.digest(path))
+    header = None if rebuild else cache.read_header(entry)
+    if fresh_cache(header):
+        return path, entry, header['bounds'], True, time.time() - start
+    if not compile:
+        return path, None, None, False, time.time() - start
+    model = Model()
+    model.init(path, True)
+    entry = model.cacheEntry if os.path.isfile(model.cacheEntry) else None
+    return path, entry, model.bounds(), False, time.time() - start
+
+def fresh_cache(header):
+    """Return whether a model's cache entry header (or None) is of this
+    CACHE_VERSION and its .mtl files are unchanged.
+    
+    """
+    if header is None or header['version'] != CACHE_VERSION:
+        return False
+    for (path, key) in header['sources'][1:]:
+        if not os.path.isfile(path) or cache.digest(path) != key:
+            return False
+    return True
 
 class Material(object):
     """Encapsulates OpenGL material properties."""
@@ -63,6 +205,20 @@ class Material(object):
         self.emissive = emissive 
         self.shininess = shininess
     
+    def properties(self):
+        """Return this Material's properties as keyword arguments."""
+        return {'ambient': self.ambient, 'diffuse': self.diffuse,
+                'specular': self.specular, 'emissive': self.emissive,
+                'shininess': self.shininess}
+    
+    def key(self):
+        """Return a hashable (and sortable) key of this Material's properties:
+        Materials with equal keys set the same OpenGL state.
+        
+        """
+        return (tuple(self.ambient), tuple(self.diffuse), tuple(self.specular),
+                tuple(self.emissive), self.shininess)
+    
     def activate(self):
         """Load this Material's properties into OpenGL."""
         glMaterialfv(GL_FRONT, GL_AMBIENT,  self.ambient)
@@ -83,87 +239,189 @@ class Material(object):
                 self.emissive, self.shininess)
         
 class Mesh(object):
-    """Collection of faces and associated materials."""
-    def __init__(self):
+    """Range of triangles (in a Model's index arrays) sharing a material."""
+    def __init__(self, first=0):
         """Constructor"""
         super(Mesh, self).__init__()
-        self.faces = []
+        self.first = first  #index of this Mesh's first triangle
+        self.count = 0      #number of triangles in this Mesh
+        self.vertexIndices = numpy.zeros((0, 3), numpy.int32)
+        self.normalIndices = numpy.zeros((0, 3), numpy.int32)
         self.material = Material()
     
     def __str__(self):
         """Return a string representation of this Mesh."""
         return '''Mesh[%s]:
-          faces (%d): %s
+          triangles (%d): [%d, %d)
           material: %s
-        ''' % (self.__hash__(), len(self.faces), str(self.faces), self.material)
+        ''' % (self.__hash__(), self.count, self.first,
+                self.first + self.count, self.material)
         
     def __nonzero__(self):
-        """Return True if this Mesh has at least one face."""
-        return len(self.faces) > 0
+        """Return True if this Mesh has at least one triangle."""
+        return self.count > 0
 
-class Face(object):
-    """Polygon (vertices and normal) representing a facet of 3D shape."""
-    def __init__(self):
+class GrowableArray(object):
+    """An array of rows that grows by half again as rows are appended."""
+    def __init__(self, shape, dtype):
         """Constructor"""
-        super(Face, self).__init__()
-        self.vertexIndices = []
-        self.normalIndices = []
+        super(GrowableArray, self).__init__()
+        self.data = numpy.zeros((0,) + shape, dtype)
+        self.size = 0 #rows in use
     
-    def __str__(self):
-        """Return a string representation of this Face."""
-        return '''face[%s]:
-          vInd: %s
-          nInd: %s
-        ''' % (self.__hash__(), self.vertexIndices, self.normalIndices)
-  
+    def __len__(self):
+        """Return the number of rows appended."""
+        return self.size
+    
+    def append(self, rows):
+        """Append an array of rows."""
+        size = self.size + len(rows)
+        if size > len(self.data):
+            capacity = max(size, len(self.data) * 3 // 2, 1024)
+            data = numpy.empty((capacity,) + self.data.shape[1:],
+                    self.data.dtype)
+            data[0:self.size] = self.data[0:self.size]
+            self.data = data
+        self.data[self.size:size] = rows
+        self.size = size
+    
+    def array(self):
+        """Trim the spare rows and hand over the array, leaving this empty."""
+        data = self.data
+        if self.size < len(data):
+            data = data[0:self.size].copy()
+        self.data = numpy.zeros((0,) + data.shape[1:], data.dtype)
+        self.size = 0
+        return data
+
 class OBJLoader(object):
-    """Loads properties from .obj/.mtl files to construct a Model."""
+    """Loads properties from .obj/.mtl files to construct a Model, parsing them
+    in chunks straight into numpy arrays.
+    
+    """
     def __init__(self):
         """Constructor"""
         super(OBJLoader, self).__init__()
-        self.vertices = []
-        self.normals = []
+        self.vertices = numpy.zeros((0, 3), numpy.float32)
+        self.normals = numpy.zeros((0, 3), numpy.float32)
+        self.vertexIndices = numpy.zeros((0, 3), numpy.int32)
+        self.normalIndices = numpy.zeros((0, 3), numpy.int32)
         self.meshes = []
         self.mtllib = {}
+        self.arrays = {
+            'v': GrowableArray((3,), numpy.float32),
+            'vn': GrowableArray((3,), numpy.float32),
+            'fv': GrowableArray((3,), numpy.int32),
+            'fn': GrowableArray((3,), numpy.int32)
+        }
+        self.unhandled = set()
+        self.sources = [] #paths of the files read
     
     def init(self, path):
         """Initialize this OBJLoader with the file at the specified path."""
-        activeMesh = Mesh()
+        self.meshes = [Mesh()]
+        self.sources.append(path)
         with open(path) as file:
-            content = file.readlines()
-            for line in content:
-                data = line.strip().split()
-                if data is None or data[0].startswith('#'):
+            rest = '' #the unfinished line at the end of the last chunk
+            while True:
+                chunk = file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                text = rest + chunk
+                end = text.rfind('\n') + 1
+                self.parse_lines(text[:end].splitlines(), os.path.dirname(path))
+                rest = text[end:]
+            self.parse_lines(rest.splitlines(), os.path.dirname(path))
+        self.finish()
+        for key in sorted(self.unhandled):
+            print >> sys.stderr, 'init> unhandled key: %s' % key
+    
+    def parse_lines(self, lines, dir):
+        """Sort lines by keyword, then parse each kind of record in bulk."""
+        records = {'v': [], 'vn': [], 'f': []}
+        (vertices, normals, faces) = (records['v'], records['vn'], records['f'])
+        for line in lines:
+            key = line[:2]
+            if key == 'v ':
+                if faces:
+                    self.parse_records(records)
+                vertices.append(line[2:])
+            elif key == 'vn':
+                if faces:
+                    self.parse_records(records)
+                normals.append(line[2:])
+            elif key == 'f ':
+                faces.append(line[2:])
+            else:
+                data = line.split(None, 1)
+                if not data or data[0].startswith('#'):
                     continue
-                if data[0] == 'v':
-                    self.vertices.append(self.parse_vertex(data[1:]))
-                elif data[0] == 'vn':
-                    self.normals.append(self.parse_normal(data[1:]))
-                elif data[0] == 'vt':
-                    pass
-                elif data[0] == 'f':
-                    activeMesh.faces.append(self.parse_face(data[1:]))
+                if data[0] in records:
+                    if faces and data[0] != 'f':
+                        self.parse_records(records)
+                    records[data[0]].append(data[1])
                 elif data[0] == 'mtllib':
-                    dir = os.path.dirname(path)
-                    for mfn in data[1:]:
+                    for mfn in data[1].split():
                         self.load_mtllib(os.path.join(dir, mfn))
                 elif data[0] == 'usemtl':
-                    if activeMesh:
-                        self.meshes.append(activeMesh)
-                    activeMesh = Mesh()
-                    name = data[1]
-                    if self.mtllib.has_key(name):
-                        activeMesh.material = self.mtllib[name]
-                elif data[0] == 's':
+                    self.parse_records(records)
+                    self.use_material(data[1].split()[0])
+                elif data[0] in ('vt', 's'):
                     pass
                 else:
-                    print >> sys.stderr, 'init> unhandled key: %s' % data[0]
-            self.meshes.append(activeMesh)
+                    self.unhandled.add(data[0])
+        self.parse_records(records)
+    
+    def parse_records(self, records):
+        """Parse (and then clear) the sorted records of parse_lines()."""
+        if records['v']:
+            self.append('v', self.parse_vertices(records['v']))
+        if records['vn']:
+            self.append('vn', self.parse_normals(records['vn']))
+        if records['f']:
+            (vertexIndices, normalIndices) = self.parse_faces(records['f'])
+            self.append('fv', vertexIndices)
+            self.append('fn', normalIndices)
+            self.meshes[-1].count += len(vertexIndices)
+        for key in records:
+            del records[key][:]
+    
+    def append(self, key, array):
+        """Append a parsed array to the arrays finish() hands over."""
+        self.arrays[key].append(array)
+    
+    def use_material(self, name):
+        """Start a new Mesh using the named material."""
+        if self.meshes[-1]:
+            self.meshes.append(Mesh(len(self.arrays['fv'])))
+        if self.mtllib.has_key(name):
+            self.meshes[-1].material = self.mtllib[name]
+    
+    def finish(self):
+        """Take the parsed arrays and point each Mesh at its triangles."""
+        self.vertices = self.arrays['v'].array()
+        self.normals = self.arrays['vn'].array()
+        self.vertexIndices = self.arrays['fv'].array()
+        self.normalIndices = self.arrays['fn'].array()
+        
+        self.meshes = [mesh for mesh in self.meshes if mesh]
+        self.link_meshes()
+    
+    def link_meshes(self, meshes=None):
+        """Point each Mesh (default: self.meshes) at its range of the index
+        arrays.
+        
+        """
+        for mesh in self.meshes if meshes is None else meshes:
+            last = mesh.first + mesh.count
+            mesh.vertexIndices = self.vertexIndices[mesh.first:last]
+            mesh.normalIndices = self.normalIndices[mesh.first:last]
 
     def load_mtllib(self, path):
         """Load the specified .mtl file's properties into this OBJLoader."""
         mtlname = None
         material = None
+        self.sources.append(path)
         with open(path) as file:
             for line in file:
                 m = line.strip().split()
@@ -189,25 +447,458 @@ class OBJLoader(object):
             if material is not None:
                 self.mtllib[mtlname] = material
         
-    def parse_face(self, data):
-        """Parse a facet of the shape from the specified data (line)."""
-        face = Face()
-        for packet in data:
-            elements = packet.split('/')
-            face.vertexIndices.append(int(elements[0]) - 1) #shift index
-            if len(elements) > 1 and elements[1]:
-                pass
-            if len(elements) > 2 and elements[2]:
-                face.normalIndices.append(int(elements[2]) - 1) #shift index
-        return face
-    
-    def parse_normal(self, data):
-        """Parse the normal of a face from the specified data (line)."""
-        return coordinates.normalize([float(n) for n in data])
+    def parse_faces(self, records):
+        """Parse and fan-triangulate face records into (vertexIndices,
+        normalIndices) of 0-based indices (-1 for no normal).
+        
+        """
+        #parse every packet in the first one's layout (v, v/t, v//n or v/t/n)
+        #  if they all share it; indices are 1-based, so a packet of zeros
+        #  can terminate each face
+        layout = records[0].split(None, 1)[0].split('/')
+        stride = len([n for n in layout if n])
+        terminator = ' %s ' % ' '.join(['0'] * stride)
+        text = terminator.join(records) + terminator
+        packets = numpy.fromstring(text.replace('/', ' '), numpy.int32, sep=' ')
+        hasNormal = len(layout) > 2 and layout[2] != ''
+        if not same_layout(text, layout, len(packets) - stride * len(records)):
+            #mixed: pad every packet out to v/t/n, 0 marking a missing index
+            (stride, hasNormal) = (3, True)
+            text = pad_packets(' 0 '.join(records) + ' 0')
+            packets = numpy.fromstring(text.replace('/', ' '), numpy.int32,
+                    sep=' ')
+        if len(packets) % stride:
+            raise ValueError('inconsistent face format near "%s"' % records[0])
+        packets = packets.reshape(-1, stride)
+        ends = numpy.flatnonzero(packets[:, 0] == 0)
+        if len(ends) != len(records):
+            raise ValueError('inconsistent face format near "%s"' % records[0])
+        
+        #fan out each n-gon: (0, j, j + 1) for j in [1, n - 2]
+        starts = numpy.concatenate(([0], ends[:-1] + 1))
+        fans = numpy.maximum(ends - starts - 2, 0)
+        face = numpy.repeat(numpy.arange(len(fans)), fans)
+        j = numpy.arange(len(face)) - numpy.repeat(numpy.cumsum(fans) - fans,
+                fans) + 1
+        origin = starts[face]
+        corners = numpy.column_stack((origin, origin + j, origin + j + 1))
+        
+        vertexIndices = self.shift(packets[corners, 0], len(self.arrays['v']))
+        if hasNormal:
+            normalIndices = self.shift(packets[corners, stride - 1],
+                    len(self.arrays['vn']))
+        else:
+            normalIndices = numpy.empty_like(vertexIndices)
+            normalIndices.fill(-1)
+        return vertexIndices, normalIndices
+    
+    def shift(self, indices, count):
+        """Convert 1-based (or negative, relative) indices to 0-based ones;
+        0 (missing) becomes -1.
+        
+        """
+        return numpy.where(indices < 0, indices + count, indices - 1)
+    
+    def parse_normals(self, records):
+        """Parse and normalize normal records (the text after each 'vn')."""
+        return coordinates.normalize_rows(self.parse_vertices(records))
+        
+    def parse_vertices(self, records):
+        """Parse vertex records (the text after each 'v') into an (n, 3)
+        array.
+        
+        """
+        values = numpy.fromstring(' '.join(records), numpy.float32, sep=' ')
+        if len(values) != 3 * len(records):
+            #some records carry extra components (w, color); keep x, y, z
+            values = numpy.array([r.split()[:3] for r in records], numpy.float32)
+        return values.reshape(-1, 3)
+
+def same_layout(text, layout, numbers):
+    """Return whether every packet of face text has the given layout, from the
+    counts of slashes.
+    
+    """
+    stride = len([n for n in layout if n])
+    if numbers % stride:
+        return False
+    packets = numbers // stride
+    if text.count('/') != (len(layout) - 1) * packets:
+        return False
+    if len(layout) > 2:
+        return text.count('//') == (layout[1] == '') * packets
+    #(only v/t's count can also add up from a mix: of v and v/t/n packets)
+    return len(layout) == 1 or DOUBLE_SLASH.search(text) is None
+
+def pad_packets(text):
+    """Rewrite every v, v/t and v//n packet of face text as v/t/n, with 0
+    for the missing indices.
+    
+    """
+    text = text.replace('//', '/0/')
+    return INDEX_PAIR.sub(r'\1/0', BARE_INDEX.sub(r'\1/0/0', text))
+
+def weld(vertexIndices, normalIndices):
+    """Merge identical (vertex, normal) index pairs.  Returns (pairs, indices):
+    the unique pairs as a (U, 2) array and the triangles re-indexed into them.
+    
+    """
+    base = int(normalIndices.max()) + 2 if normalIndices.size else 1
+    keys = vertexIndices.astype(numpy.int64) * base + (normalIndices + 1)
+    (unique, inverse) = numpy.unique(keys.ravel(), return_inverse=True)
+    pairs = numpy.column_stack((unique // base, unique % base - 1))
+    return pairs, inverse.reshape(-1, 3).astype(numpy.int32)
+
+def optimize_vertex_cache(triangles, cacheSize=VERTEX_CACHE_SIZE):
+    """Reorder (T, 3) triangles for the post-transform vertex cache (Tipsify;
+    Sander, Nehab and Barczak, 2007).
+    
+    """
+    if len(triangles) == 0:
+        return triangles
+    (ids, local) = numpy.unique(triangles.ravel(), return_inverse=True)
+    count = len(ids)
+    #vertex -> triangles adjacency (CSR)
+    order = numpy.argsort(local, kind='mergesort')
+    starts = numpy.concatenate(([0], numpy.cumsum(numpy.bincount(local,
+            minlength=count)))).tolist()
+    adjacent = (order // 3).tolist()
+    corners = local.reshape(-1, 3).tolist()
+    live = numpy.bincount(local, minlength=count).tolist()
+    stamps = [0] * count
+    emitted = [False] * len(corners)
+    output = []
+    deadEnds = []
+    clock = cacheSize + 1
+    cursor = 0
+    fan = 0
+    while fan >= 0:
+        candidates = []
+        for t in adjacent[starts[fan]:starts[fan + 1]]:
+            if emitted[t]:
+                continue
+            emitted[t] = True
+            output.append(t)
+            for v in corners[t]:
+                candidates.append(v)
+                deadEnds.append(v)
+                live[v] -= 1
+                if clock - stamps[v] > cacheSize:
+                    stamps[v] = clock
+                    clock += 1
+        #next fan: the candidate that will (probably) still be cached
+        fan = -1
+        best = -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = 0
+                if clock - stamps[v] + 2 * live[v] <= cacheSize:
+                    priority = clock - stamps[v]
+                if priority > best:
+                    (best, fan) = (priority, v)
+        if fan < 0:
+            while deadEnds:
+                v = deadEnds.pop()
+                if live[v] > 0:
+                    fan = v
+                    break
+        while fan < 0 and cursor < count:
+            if live[cursor] > 0:
+                fan = cursor
+            cursor += 1
+    return triangles[numpy.array(output)]
+
+def acmr(triangles, cacheSize=VERTEX_CACHE_SIZE):
+    """Return the average cache miss ratio (vertices transformed per
+    triangle) of (T, 3) triangles drawn through a FIFO vertex cache.
+    
+    """
+    if len(triangles) == 0:
+        return 0.0
+    stamps = {}
+    misses = 0
+    for v in triangles.ravel().tolist():
+        if misses - stamps.get(v, -cacheSize - 1) > cacheSize:
+            stamps[v] = misses
+            misses += 1
+    return float(misses) / len(triangles)
+
+def order_vertices(triangles, count):
+    """Renumber the vertices of (T, 3) triangles by first use; returns (order,
+    triangles).
+    
+    """
+    (unique, first) = numpy.unique(triangles.ravel(), return_index=True)
+    order = unique[numpy.argsort(first)]
+    remap = numpy.zeros(count, numpy.int32)
+    remap[order] = numpy.arange(len(order), dtype=numpy.int32)
+    return order, remap[triangles]
+
+def smooth_normals(positions, triangles):
+    """Return area-weighted unit vertex normals for (T, 3) triangles."""
+    corners = positions[triangles]
+    #the cross product's length is twice the area, so it weights by area
+    faces = numpy.cross(corners[:, 1] - corners[:, 0],
+            corners[:, 2] - corners[:, 0])
+    normals = numpy.zeros((len(positions), 3))
+    for axis in xrange(3):
+        for corner in xrange(3):
+            normals[:, axis] += numpy.bincount(triangles[:, corner],
+                    faces[:, axis], len(positions))
+    return coordinates.normalize_rows(normals).astype(numpy.float32)
+
+def generate_normals(vertices, triangles, creaseAngle=CREASE_ANGLE):
+    """Generate area-weighted normals for (T, 3) triangles, split at creases
+    sharper than creaseAngle; returns (normals, normalIndices).
+    
+    """
+    corners = vertices[triangles].astype(numpy.float64)
+    areas = numpy.cross(corners[:, 1] - corners[:, 0],
+            corners[:, 2] - corners[:, 0])
+    faces = coordinates.normalize_rows(areas).astype(numpy.float32)
+    smooth = smooth_normals(vertices, triangles)
+    vertex = triangles.ravel()
+    face = numpy.repeat(numpy.arange(len(triangles)), 3)
+    normalIndices = vertex.copy() #into smooth, until split
+    
+    #a vertex whose faces are all within half the crease angle of its smooth
+    #  normal has none more than the crease angle apart: only split the rest
+    agreement = (faces[face] * smooth[vertex]).sum(axis=1)
+    creased = numpy.zeros(len(vertices), bool)
+    creased[vertex[(agreement < math.cos(math.radians(creaseAngle) / 2)) &
+                   faces.any(axis=1)[face]]] = True
+    split = numpy.flatnonzero(creased[vertex])
+    if not len(split):
+        return smooth, normalIndices.reshape(-1, 3).astype(numpy.int32)
+    
+    #pair each split corner with every corner of its vertex (itself too), a
+    #  block of pairs at a time, and sum the faces within the crease angle
+    split = split[numpy.argsort(vertex[split])]
+    starts = numpy.flatnonzero(numpy.diff(numpy.concatenate(([-1],
+            vertex[split]))))
+    degrees = numpy.diff(numpy.append(starts, len(split)))
+    groups = numpy.repeat(starts, degrees)  #first corner of each's vertex
+    degree = numpy.repeat(degrees, degrees) #pairs of each corner
+    pairEnds = numpy.cumsum(degree)
+    pairStarts = pairEnds - degree
+    cosine = math.cos(math.radians(creaseAngle))
+    sums = numpy.zeros((len(split), 3))
+    first = 0
+    while first < len(split):
+        last = max(first + 1, int(numpy.searchsorted(pairEnds,
+                pairStarts[first] + NORMAL_PAIRS, 'right')))
+        i = numpy.repeat(numpy.arange(first, last), degree[first:last])
+        j = groups[i] + numpy.arange(len(i)) - (pairStarts[i] -
+                pairStarts[first])
+        (fi, fj) = (face[split[i]], face[split[j]])
+        keep = (faces[fi] * faces[fj]).sum(axis=1) >= cosine
+        (i, fj) = (i[keep] - first, fj[keep])
+        for axis in xrange(3):
+            sums[first:last, axis] = numpy.bincount(i, areas[fj, axis],
+                    last - first)
+        first = last
+    sums = coordinates.normalize_rows(sums).astype(numpy.float32)
+    degenerate = ~sums.any(axis=1)
+    sums[degenerate] = smooth[vertex[split[degenerate]]]
+    
+    #split corners with identical normals share them
+    (unique, inverse) = numpy.unique(sums.view(numpy.dtype((numpy.void,
+            sums.itemsize * 3))).ravel(), return_inverse=True)
+    normalIndices[split] = len(smooth) + inverse
+    return (numpy.concatenate((smooth, unique.view(numpy.float32).reshape(-1,
+            3))), normalIndices.reshape(-1, 3).astype(numpy.int32))
+
+def quadrics(positions, triangles):
+    """Return the (V, 4, 4) error quadrics of the vertices of (T, 3) triangles,
+    with open edges weighted to stay in place.
+    
+    """
+    corners = positions[triangles]
+    cross = numpy.cross(corners[:, 1] - corners[:, 0],
+            corners[:, 2] - corners[:, 0])
+    area = numpy.sqrt((cross * cross).sum(axis=1)) / 2
+    normals = coordinates.normalize_rows(cross)
+    planes = numpy.column_stack((normals,
+            -(normals * corners[:, 0]).sum(axis=1)))
+    faceQuadrics = (area[:, None, None] * planes[:, :, None] *
+            planes[:, None, :]).reshape(-1, 16)
+    vertexQuadrics = numpy.zeros((len(positions), 16))
+    for corner in xrange(3):
+        for i in xrange(16):
+            vertexQuadrics[:, i] += numpy.bincount(triangles[:, corner],
+                    faceQuadrics[:, i], len(positions))
+    
+    #edges used by only one triangle are open; constrain them with planes
+    #  perpendicular to their face
+    edges = numpy.concatenate((triangles[:, [0, 1]], triangles[:, [1, 2]],
+            triangles[:, [2, 0]]))
+    keys = numpy.sort(edges, axis=1)
+    (unique, inverse, counts) = numpy.unique(keys[:, 0] * len(positions) +
+            keys[:, 1], return_inverse=True, return_counts=True)
+    boundary = numpy.flatnonzero(counts[inverse] == 1)
+    if len(boundary):
+        face = boundary % len(triangles)
+        (a, b) = (positions[edges[boundary, 0]], positions[edges[boundary, 1]])
+        normal = coordinates.normalize_rows(numpy.cross(b - a, normals[face]))
+        planes = numpy.column_stack((normal, -(normal * a).sum(axis=1)))
+        weight = 1000.0 * ((b - a) ** 2).sum(axis=1)
+        edgeQuadrics = (weight[:, None, None] * planes[:, :, None] *
+                planes[:, None, :]).reshape(-1, 16)
+        for end in xrange(2):
+            for i in xrange(16):
+                vertexQuadrics[:, i] += numpy.bincount(edges[boundary, end],
+                        edgeQuadrics[:, i], len(positions))
+    return vertexQuadrics.reshape(-1, 4, 4)
+
+def quadric_error(quadric, point):
+    """Return the error of a point under a symmetric quadric, given as its
+    upper triangle (q11, q12, q13, q14, q22, q23, q24, q33, q34, q44).
+    
+    """
+    (q11, q12, q13, q14, q22, q23, q24, q33, q34, q44) = quadric
+    (x, y, z) = point
+    return (x * (q11 * x + 2 * (q12 * y + q13 * z + q14)) +
+            y * (q22 * y + 2 * (q23 * z + q24)) +
+            z * (q33 * z + 2 * q34) + q44)
+
+def collapse_target(quadric, a, b):
+    """Return (cost, position) of the vertex replacing the edge (a, b), given
+    their summed quadric.
+    
+    """
+    (q11, q12, q13, q14, q22, q23, q24, q33, q34, q44) = quadric
+    #minimize the error by solving for a zero gradient (Cramer's rule)
+    (m11, m12, m13) = (q22 * q33 - q23 * q23, q13 * q23 - q12 * q33,
+                       q12 * q23 - q13 * q22)
+    det = q11 * m11 + q12 * m12 + q13 * m13
+    scale = q11 + q22 + q33
+    if abs(det) > 1e-9 * scale * scale * scale:
+        (r1, r2, r3) = (-q14, -q24, -q34)
+        position = (
+            (r1 * m11 + r2 * m12 + r3 * m13) / det,
+            (r1 * m12 + r2 * (q11 * q33 - q13 * q13) +
+             r3 * (q12 * q13 - q11 * q23)) / det,
+            (r1 * m13 + r2 * (q12 * q13 - q11 * q23) +
+             r3 * (q11 * q22 - q12 * q12)) / det)
+        return quadric_error(quadric, position), position
+    #singular (e.g. flat region): pick the best of the ends and midpoint
+    middle = ((a[0] + b[0]) / 2, (a[1] + b[1]) / 2, (a[2] + b[2]) / 2)
+    return min((quadric_error(quadric, position), position)
+               for position in (a, b, middle))
+
+def normal(p, q, r):
+    """Return the (unnormalized) normal of triangle (p, q, r)."""
+    (ux, uy, uz) = (q[0] - p[0], q[1] - p[1], q[2] - p[2])
+    (vx, vy, vz) = (r[0] - p[0], r[1] - p[1], r[2] - p[2])
+    return (uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx)
+
+def simplify(positions, triangles, targets):
+    """Simplify a mesh by quadric error edge collapse (Garland and Heckbert,
+    1997); returns a (positions, triangles, faces) snapshot per target.
+    
+    """
+    upper = [0, 1, 2, 3, 5, 6, 7, 10, 11, 15] #of a flattened 4x4 matrix
+    upperQuadrics = quadrics(numpy.asarray(positions, numpy.float64),
+            triangles).reshape(-1, 16)[:, upper]
+    quadric = [tuple(q) for q in upperQuadrics.tolist()]
+    position = [tuple(p) for p in numpy.asarray(positions,
+            numpy.float64).tolist()]
+    corners = triangles.tolist()
+    faces = [set() for i in xrange(len(position))]
+    for (t, corner) in enumerate(corners):
+        for v in corner:
+            faces[v].add(t)
+    stamps = [0] * len(position)
+    alive = len(corners)
+    
+    heap = []
+    def push(a, b):
+        summed = tuple(map(operator.add, quadric[a], quadric[b]))
+        (cost, target) = collapse_target(summed, position[a], position[b])
+        heapq.heappush(heap, (cost, a, b, stamps[a], stamps[b], target))
+    
+    #sum the quadrics of every initial edge at once, then heapify
+    edges = numpy.sort(numpy.concatenate((triangles[:, [0, 1]],
+            triangles[:, [1, 2]], triangles[:, [2, 0]])), axis=1).astype(
+            numpy.int64)
+    keys = numpy.unique(edges[:, 0] * len(position) + edges[:, 1])
+    (first, second) = (keys // len(position), keys % len(position))
+    summed = (upperQuadrics[first] + upperQuadrics[second]).tolist()
+    for (a, b, quadricAB) in zip(first.tolist(), second.tolist(), summed):
+        (cost, target) = collapse_target(quadricAB, position[a], position[b])
+        heap.append((cost, a, b, 0, 0, target))
+    heapq.heapify(heap)
+    
+    snapshots = []
+    targets = list(targets)
+    while targets:
+        if alive <= targets[0] or not heap:
+            snapshots.append(snapshot(position, corners))
+            targets.pop(0)
+            continue
+        (cost, a, b, stampA, stampB, target) = heapq.heappop(heap)
+        if stamps[a] != stampA or stamps[b] != stampB:
+            continue #an end has moved (or gone) since this was pushed
+        
+        #reject collapses that would pinch the surface (the ends may only
+        #  share the neighbors of the triangles between them) or flip a
+        #  surviving triangle
+        shared = faces[a] & faces[b]
+        if len(ring(a, corners, faces) & ring(b, corners, faces)) != len(shared):
+            continue
+        flipped = False
+        for t in (faces[a] | faces[b]) - shared:
+            before = normal(*[position[v] for v in corners[t]])
+            after = normal(*[target if v == a or v == b else position[v]
+                             for v in corners[t]])
+            if (before[0] * after[0] + before[1] * after[1] +
+                    before[2] * after[2]) <= 0.0:
+                flipped = True
+                break
+        if flipped:
+            continue
         
-    def parse_vertex(self, data):
-        """Parse a vertex of a face from the specified data (line)."""
-        return [float(n) for n in data]
+        #collapse b into a
+        for t in shared:
+            for v in corners[t]:
+                if v != a and v != b:
+                    faces[v].discard(t)
+            corners[t] = None
+        alive -= len(shared)
+        faces[a] -= shared
+        for t in faces[b] - shared:
+            corners[t] = [a if v == b else v for v in corners[t]]
+            faces[a].add(t)
+        faces[b] = set()
+        position[a] = target
+        quadric[a] = tuple(map(operator.add, quadric[a], quadric[b]))
+        stamps[a] += 1
+        stamps[b] += 1
+        for v in ring(a, corners, faces):
+            push(min(a, v), max(a, v))
+    return snapshots
+
+def ring(vertex, corners, faces):
+    """Return the set of vertices sharing an edge with vertex."""
+    neighbors = set()
+    for t in faces[vertex]:
+        neighbors.update(corners[t])
+    neighbors.discard(vertex)
+    return neighbors
+
+def snapshot(position, corners):
+    """Return the (positions, triangles, faces) of the live triangles of a
+    mesh being simplified, with unused vertices dropped.
+    
+    """
+    live = [t for (t, corner) in enumerate(corners) if corner is not None]
+    triangles = numpy.array([corners[t] for t in live],
+            numpy.int32).reshape(-1, 3)
+    (used, local) = numpy.unique(triangles, return_inverse=True)
+    positions = numpy.array([position[v] for v in used],
+            numpy.float32).reshape(-1, 3)
+    return positions, local.reshape(-1, 3).astype(numpy.int32), numpy.array(
+            live, numpy.int32)
 
 class Texture(object):
     """A model texture."""
@@ -234,31 +925,295 @@ class Model(OBJLoader):
         """Constructor"""
         super(Model, self).__init__()
         self.textures = {}
+        self.parseTime = 0.0 #seconds spent parsing the source files
+        self.vertexData = None #float32 (n, 6): position, normal
+        self.indexData = None  #uint32 (3 * T): triangles
+        self.hasNormals = False
+        self.acmr = (0.0, 0.0) #before and after vertex cache optimization
+        self.levels = [] #Meshes of each level of detail, finest first
+        self.sizes = []  #(triangles, vertices) of each level of detail
+        self.center = [0.0, 0.0, 0.0] #bounding sphere, in model space
+        self.radius = 0.0
+        self.lower = [0.0, 0.0, 0.0] #bounding box, in model space
+        self.upper = [0.0, 0.0, 0.0]
+        self.cacheEntry = None
+        self.vertexBuffer = None
+        self.indexBuffer = None
 
-    def init(self, file):
-        """Load properties from the specified file."""
+    def init(self, file, rebuild=False):
+        """Load properties from the mesh cache, or from the specified file
+        (caching the result); returns True if the cache was used.
+        
+        """
+        name = os.path.basename(file).rsplit('.', 1)[0]
+        entry = cache.entry('models', name, cache.digest(file))
+        self.cacheEntry = entry
+        if not rebuild and self.load_cache(entry):
+            return True
+        start = time.time()
         super(Model, self).init(file)
+        self.build()
+        self.parseTime = time.time() - start
+        try:
+            self.save_cache(entry)
+        except EnvironmentError as error:
+            print >> sys.stderr, 'init> unable to cache %s: %s' % (name, error)
+        return False
     
-    def draw(self):
-        """Draw this Model based on the properties loaded from file."""
-        glPushAttrib(GL_LIGHTING_BIT)
-        glPushMatrix()
+    def load_cache(self, entry):
+        """Map this Model's arrays from a cache entry; return False (loading
+        nothing) if there is no entry or any of its sources has changed.
+        
+        """
+        contents = cache.read(entry)
+        if contents is None or not fresh_cache(contents[0]):
+            return False
+        (header, arrays) = contents
+        self.vertexData = arrays['vertexData']
+        self.indexData = arrays['indexData']
+        self.hasNormals = header['hasNormals']
+        self.acmr = tuple(header['acmr'])
+        self.sizes = [tuple(size) for size in header['sizes']]
+        (self.center, self.radius, self.lower, self.upper) = header['bounds']
+        materials = [Material(**dict((str(key), value)
+                     for (key, value) in properties.items()))
+                     for properties in header['materials']]
+        self.levels = []
+        for level in header['levels']:
+            self.levels.append([])
+            for (first, count, material) in level:
+                mesh = Mesh(first)
+                mesh.count = count
+                mesh.material = materials[material]
+                self.levels[-1].append(mesh)
+        self.meshes = self.levels[0]
+        self.index_views()
+        self.sources = [path for (path, key) in header['sources']]
+        self.parseTime = header['parseTime']
+        return True
+    
+    def save_cache(self, entry):
+        """Write this Model's arrays to a cache entry."""
+        materials = []
         for mesh in self.meshes:
+            if mesh.material not in materials:
+                materials.append(mesh.material)
+        header = {
+            'version': CACHE_VERSION,
+            'sources': [(path, cache.digest(path)) for path in self.sources],
+            'materials': [material.properties() for material in materials],
+            'levels': [[(mesh.first, mesh.count, materials.index(mesh.material))
+                        for mesh in level] for level in self.levels],
+            'sizes': self.sizes,
+            'bounds': self.bounds(),
+            'parseTime': self.parseTime,
+            'hasNormals': bool(self.hasNormals),
+            'acmr': self.acmr
+        }
+        cache.write(entry, {
+            'vertexData': self.vertexData,
+            'indexData': self.indexData
+        }, header)
+    
+    def build(self):
+        """Build the welded, cache-ordered vertex and index data that upload()
+        sends to the GPU, levels of detail included.
+        
+        """
+        self.hasNormals = (len(self.normals) > 0 and
+                (self.normalIndices >= 0).all())
+        if not self.hasNormals and len(self.vertexIndices):
+            (self.normals, self.normalIndices) = generate_normals(
+                    self.vertices, self.vertexIndices)
+            self.hasNormals = True
+        normalIndices = self.normalIndices
+        if not self.hasNormals:
+            normalIndices = numpy.zeros_like(self.vertexIndices)
+        (pairs, triangles) = weld(self.vertexIndices, normalIndices)
+        
+        before = acmr(triangles)
+        for mesh in self.meshes:
+            last = mesh.first + mesh.count
+            triangles[mesh.first:last] = optimize_vertex_cache(
+                    triangles[mesh.first:last])
+        self.acmr = (before, acmr(triangles))
+        (order, triangles) = order_vertices(triangles, len(pairs))
+        pairs = pairs[order]
+        
+        positions = self.vertices[pairs[:, 0]]
+        if self.hasNormals:
+            normals = self.normals[pairs[:, 1]]
+        else:
+            normals = numpy.zeros_like(positions)
+        self.vertexData = numpy.hstack((positions, normals)).astype(
+                numpy.float32)
+        self.indexData = triangles.ravel().astype(numpy.uint32)
+        
+        lower = positions.min(axis=0) if len(positions) else numpy.zeros(3)
+        upper = positions.max(axis=0) if len(positions) else numpy.zeros(3)
+        center = (lower + upper) / 2
+        (self.lower, self.upper) = (lower.tolist(), upper.tolist())
+        self.center = center.tolist()
+        self.radius = float(numpy.sqrt(((positions - center) ** 2).sum(
+                axis=1).max())) if len(positions) else 0.0
+        self.build_levels()
+        self.index_views()
+    
+    def build_levels(self):
+        """Append a chain of levels of detail, each with about 1/LOD_RATIO the
+        triangles of the last, by quadric error edge collapse.
+        
+        """
+        triangles = self.indexData.reshape(-1, 3)
+        self.levels = [self.meshes]
+        self.sizes = [(len(triangles), len(self.vertexData))]
+        targets = []
+        count = len(triangles) // LOD_RATIO
+        while count >= LOD_MINIMUM:
+            targets.append(count)
+            count //= LOD_RATIO
+        if not targets:
+            return
+        (positions, welded) = numpy.unique(self.vertexData[:, 0:3], axis=0,
+                return_inverse=True)
+        meshIndices = numpy.repeat(numpy.arange(len(self.meshes)),
+                [mesh.count for mesh in self.meshes])
+        
+        vertexData = [self.vertexData]
+        indexData = [self.indexData]
+        (firstVertex, firstTriangle) = (len(self.vertexData), len(triangles))
+        for (points, level, faces) in simplify(positions, welded[triangles],
+                                               targets):
+            owners = meshIndices[faces]
+            order = numpy.argsort(owners, kind='mergesort')
+            (level, owners) = (level[order], owners[order])
+            meshes = []
+            for (i, mesh) in enumerate(self.meshes):
+                (first, last) = numpy.searchsorted(owners, [i, i + 1])
+                if last > first:
+                    level[first:last] = optimize_vertex_cache(level[first:last])
+                    meshes.append(Mesh(firstTriangle + first))
+                    meshes[-1].count = int(last - first)
+                    meshes[-1].material = mesh.material
+            (order, level) = order_vertices(level, len(points))
+            points = points[order]
+            vertexData.append(numpy.hstack((points,
+                    smooth_normals(points, level))).astype(numpy.float32))
+            indexData.append((level + firstVertex).ravel().astype(
+                    numpy.uint32))
+            self.levels.append(meshes)
+            self.sizes.append((len(level), len(points)))
+            firstVertex += len(points)
+            firstTriangle += len(level)
+        self.vertexData = numpy.concatenate(vertexData)
+        self.indexData = numpy.concatenate(indexData)
+    
+    def index_views(self):
+        """Point the loader's arrays (and each Mesh) at the built data, which
+        holds every level of detail.
+        
+        """
+        self.vertices = self.vertexData[:, 0:3]
+        self.normals = self.vertexData[:, 3:6]
+        self.vertexIndices = self.indexData.reshape(-1, 3)
+        self.normalIndices = self.vertexIndices
+        if not self.hasNormals:
+            self.normals = self.normals[0:0]
+            self.normalIndices = numpy.empty_like(self.vertexIndices)
+            self.normalIndices.fill(-1)
+        for level in self.levels:
+            self.link_meshes(level)
+    
+    def upload(self):
+        """Copy this Model's vertex and index data into buffer objects."""
+        if self.vertexData is None:
+            self.build()
+        (self.vertexBuffer, self.indexBuffer) = glGenBuffers(2)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertexBuffer)
+        glBufferData(GL_ARRAY_BUFFER, self.vertexData.nbytes, self.vertexData,
+                GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.indexBuffer)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indexData.nbytes,
+                self.indexData, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+    
+    def bounds(self):
+        """Return (center, radius, lower, upper): this Model's bounding sphere
+        and box.
+        
+        """
+        return (self.center, self.radius, self.lower, self.upper)
+    
+    def gpu_bytes(self):
+        """Return the size of this Model's buffer objects, in bytes."""
+        return self.vertexData.nbytes + self.indexData.nbytes
+    
+    def release(self):
+        """Delete this Model's buffer objects."""
+        if self.vertexBuffer is not None:
+            glDeleteBuffers(2, [self.vertexBuffer, self.indexBuffer])
+            (self.vertexBuffer, self.indexBuffer) = (None, None)
+    
+    def choose_level(self, pixels, current=None):
+        """Return the level of detail to draw for a projected radius in pixels
+        (with LOD_HYSTERESIS, so levels do not flicker).
+        
+        """
+        last = len(self.levels) - 1
+        if pixels >= LOD_PIXELS:
+            return 0
+        if pixels <= 0.0:
+            return last
+        level = math.log(LOD_PIXELS / float(pixels), math.sqrt(LOD_RATIO))
+        if (current is not None and current <= last and
+                current - LOD_HYSTERESIS <= level < current + 1 + LOD_HYSTERESIS):
+            return current
+        return max(0, min(last, int(math.floor(level))))
+    
+    def triangles(self, level=0):
+        """Return the number of triangles in a level of detail."""
+        return sum(mesh.count for mesh in self.levels[level])
+    
+    def bind(self):
+        """Bind this Model's buffer objects and point the vertex (and normal)
+        arrays into them, ready for draw_mesh().
+        
+        """
+        stride = self.vertexData.strides[0]
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertexBuffer)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.indexBuffer)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, stride, ctypes.c_void_p(0))
+        if self.hasNormals:
+            glEnableClientState(GL_NORMAL_ARRAY)
+            glNormalPointer(GL_FLOAT, stride, ctypes.c_void_p(12))
+    
+    def unbind(self):
+        """Undo bind()."""
+        glDisableClientState(GL_VERTEX_ARRAY)
+        if self.hasNormals:
+            glDisableClientState(GL_NORMAL_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+    
+    def draw_mesh(self, mesh):
+        """Draw a Mesh's range of triangles (with this Model bound)."""
+        glDrawElements(GL_TRIANGLES, 3 * mesh.count, GL_UNSIGNED_INT,
+                ctypes.c_void_p(3 * self.indexData.itemsize * mesh.first))
+    
+    def draw(self, level=0):
+        """Draw a level of detail of this Model from its buffer objects, one
+        range of triangles per material.
+        
+        """
+        glPushAttrib(GL_LIGHTING_BIT)
+        glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+        self.bind()
+        for mesh in self.levels[level]:
             if mesh.material is not None:
                 mesh.material.activate()
-            #draw each face as a bunch of triangles
-            glBegin(GL_TRIANGLES)
-            for face in mesh.faces:
-                for j in xrange(2, len(face.vertexIndices)):
-                    if len(face.normalIndices) > 0:
-                        glNormal3fv(self.normals[face.normalIndices[0]])
-                    glVertex3fv(self.vertices[face.vertexIndices[0]])
-                    if len(face.normalIndices) > 0:
-                        glNormal3fv(self.normals[face.normalIndices[j - 1]])
-                    glVertex3fv(self.vertices[face.vertexIndices[j - 1]])
-                    if len(face.normalIndices) > 0:
-                        glNormal3fv(self.normals[face.normalIndices[j]])
-                    glVertex3fv(self.vertices[face.vertexIndices[j]])
-            glEnd()
-        glPopMatrix()
+            self.draw_mesh(mesh)
+        self.unbind()
+        glPopClientAttrib()
         glPopAttrib()
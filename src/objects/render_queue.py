@@ -0,0 +1,96 @@
+"""Queue of draws, issued in batches that share OpenGL state."""
+__author__ = "Micah Larson"
+__date__   = "$Oct 16, 2026 2:05:37 PM$"
+
+from OpenGL.GL import *   #@UnusedWildImport
+from OpenGL.GLU import *  #@UnusedWildImport
+from OpenGL.GLUT import * #@UnusedWildImport
+
+import numpy
+
+class RenderQueue(object):
+    """Collects the draws of a pass and issues them sorted by texture, material
+    and buffers, opaque front to back and late ones last.
+    
+    """
+    def __init__(self):
+        """Constructor"""
+        super(RenderQueue, self).__init__()
+        self.items = []
+        #state changes (and draws) since reset()
+        self.statistics = {'draws': 0, 'textures': 0, 'materials': 0,
+                           'buffers': 0}
+    
+    def reset(self):
+        """Zero the state change statistics (once per frame)."""
+        for key in self.statistics:
+            self.statistics[key] = 0
+    
+    def submit(self, draw, material=None, texture=None, buffers=None,
+               position=(0.0, 0.0, 0.0), late=False):
+        """Queue a draw (a callable that sets up its own transform) under a
+        material, texture and buffers (each may be None), ordered by position;
+        late draws follow the opaque ones.
+        
+        """
+        key = material.key() if material is not None else None
+        bufferKey = id(buffers) if buffers is not None else 0
+        self.items.append((texture, key, bufferKey, position, draw, material,
+                buffers, late))
+    
+    def flush(self):
+        """Issue (and then clear) the queued draws under the current modelview
+        matrix, restoring the lighting, texture and vertex array state after.
+        
+        """
+        modelview = glGetDoublev(GL_MODELVIEW_MATRIX) #column major
+        positions = numpy.array([item[3] for item in self.items],
+                numpy.float64).reshape(-1, 3)
+        #distance in front of the eye along the view axis
+        depths = -(numpy.dot(positions, modelview[0:3, 2]) + modelview[3][2])
+        order = sorted(xrange(len(self.items)), key=lambda i:
+                (True, -depths[i]) if self.items[i][7] else
+                (False,) + self.items[i][0:3] + (depths[i],))
+        
+        glPushAttrib(GL_ENABLE_BIT | GL_LIGHTING_BIT | GL_TEXTURE_BIT)
+        glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+        unset = object()
+        (texture, key, bound) = (unset, unset, None)
+        for i in order:
+            (itemTexture, itemKey, bufferKey, position, draw, material,
+                    buffers, late) = self.items[i]
+            if itemTexture != texture:
+                texture = itemTexture
+                bind_texture(texture)
+                self.statistics['textures'] += 1
+            if material is not None and itemKey != key:
+                key = itemKey
+                material.activate()
+                self.statistics['materials'] += 1
+            if buffers is not bound:
+                if bound is not None:
+                    bound.unbind()
+                bound = buffers
+                if bound is not None:
+                    bound.bind()
+                    self.statistics['buffers'] += 1
+            draw()
+            self.statistics['draws'] += 1
+        if bound is not None:
+            bound.unbind()
+        glPopClientAttrib()
+        glPopAttrib()
+        del self.items[:]
+
+def bind_texture(texture):
+    """Bind (and enable) a 2D texture, modulating the lit color; None unbinds
+    (and disables) 2D texturing.
+    
+    """
+    if texture is None:
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glDisable(GL_TEXTURE_2D)
+    else:
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, texture)
+        glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_MODULATE)
@@ -0,0 +1,226 @@
+"""Single pass lighting and shadows, in place of the fixed function passes."""
+__author__ = "Micah Larson"
+__date__   = "$Oct 16, 2026 10:52:04 PM$"
+
+from OpenGL.GL import *   #@UnusedWildImport
+from OpenGL.GL import shaders
+
+import sys
+
+import numpy
+
+SHADOW_LIGHT = 0.3 #fraction of the direct light that shadowed fragments get
+MAX_CASCADES = 4 #shadow map cascades of the primary light
+MAX_LIGHTS = 4 #lights LIGHTING has room for
+MAX_SHADOWS = 8 #shadow maps (of lights and cascades) FRAGMENT_SHADER can take
+
+#lights an eye space vertex from GL_LIGHT0 on as the fixed function would,
+#keeping each light's diffuse and specular part in direct to be shadowed
+LIGHTING = """
+uniform int lights;
+varying vec4 direct[4];
+
+void light_vertex(vec4 eye, vec3 normal)
+{
+    gl_FrontColor = gl_FrontLightModelProduct.sceneColor;
+    for (int i = 0; i < 4; i++) {
+        direct[i] = vec4(0.0);
+        if (i >= lights)
+            continue;
+        vec4 position = gl_LightSource[i].position;
+        vec3 light = normalize(position.xyz - eye.xyz * position.w);
+        float diffuse = max(dot(normal, light), 0.0);
+        vec3 halfway = normalize(light + vec3(0.0, 0.0, 1.0));
+        float specular = 0.0;
+        if (diffuse > 0.0)
+            specular = pow(max(dot(normal, halfway), 0.0),
+                    gl_FrontMaterial.shininess);
+        direct[i] = vec4((gl_FrontLightProduct[i].diffuse * diffuse +
+                gl_FrontLightProduct[i].specular * specular).rgb, 0.0);
+        gl_FrontColor += gl_FrontLightProduct[i].ambient + direct[i];
+    }
+    gl_FrontColor.a = gl_FrontMaterial.diffuse.a;
+    gl_TexCoord[1] = vec4(dot(eye, gl_EyePlaneS[1]), dot(eye, gl_EyePlaneT[1]),
+            dot(eye, gl_EyePlaneR[1]), dot(eye, gl_EyePlaneQ[1]));
+    gl_TexCoord[3] = eye;
+    gl_ClipVertex = eye;
+    gl_Position = gl_ProjectionMatrix * eye;
+}
+"""
+VERTEX_SHADER = """
+#version 120
+""" + LIGHTING + """
+void main()
+{
+    vec4 eye = gl_ModelViewMatrix * gl_Vertex;
+    light_vertex(eye, normalize(gl_NormalMatrix * gl_Normal));
+    gl_TexCoord[0] = gl_TextureMatrix[0] * gl_MultiTexCoord0;
+}
+"""
+#modulates by texture unit 0 and takes each light's shadowed share of direct
+#away; a light's first shadow reaching the fragment's depth is sampled once,
+#after the loop (a lookup inside it is far slower on software rasterizers)
+FRAGMENT_SHADER = """
+#version 120
+uniform sampler2D image;
+uniform sampler2DShadow shadowMap;
+uniform float shadowLight;
+uniform int lights;
+uniform int shadows;
+uniform int shadowLights[8];
+uniform float splits[8];
+uniform mat4 shadowMatrices[8];
+varying vec4 direct[4];
+
+float shadow(int light)
+{
+    if (shadows == 0)
+        return (light == 0) ? shadow2DProj(shadowMap, gl_TexCoord[1]).r : 1.0;
+    int found = -1;
+    for (int i = 0; i < 8; i++) {
+        if (i >= shadows)
+            break;
+        if (found < 0 && shadowLights[i] == light &&
+                -gl_TexCoord[3].z <= splits[i])
+            found = i;
+    }
+    if (found < 0)
+        return 1.0;
+    return shadow2DProj(shadowMap, shadowMatrices[found] * gl_TexCoord[3]).r;
+}
+
+void main()
+{
+    vec4 color = gl_Color;
+    for (int i = 0; i < 4; i++)
+        if (i < lights)
+            color -= direct[i] * (1.0 - shadow(i)) * (1.0 - shadowLight);
+    gl_FragColor = clamp(color, 0.0, 1.0) * texture2D(image,
+            gl_TexCoord[0].st);
+}
+"""
+program = None #the linked program; False if shading is unsupported
+active = False #whether program is in use (between begin() and end())
+configured = [] #programs configure() has set up (kept up to date)
+shadowing = (1, []) #lights, and (light, split, eye space matrix) of each shadow
+
+def init():
+    """Link the shading program (the first time) and return whether single pass
+    shading is supported.
+    
+    """
+    global program
+    if program is not None:
+        return bool(program)
+    program = False
+    if not bool(glCreateProgram):
+        print >> sys.stderr, 'init> shaders are not supported'
+        return False
+    try:
+        linked = link(VERTEX_SHADER, FRAGMENT_SHADER)
+    except RuntimeError as error:
+        print >> sys.stderr, 'init> unable to build shading: %s' % error
+        return False
+    configure(linked)
+    #untextured draws unbind to the default texture: make it one white texel
+    glActiveTexture(GL_TEXTURE0)
+    glBindTexture(GL_TEXTURE_2D, 0)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, 1, 1, 0, GL_RGBA,
+            GL_UNSIGNED_BYTE, '\xff' * 4)
+    program = linked
+    return True
+
+def link(vertex, fragment=None):
+    """Compile and link a program from vertex (and fragment) shader source,
+    raising RuntimeError if either fails.
+    
+    """
+    compiled = [shaders.compileShader(vertex, GL_VERTEX_SHADER)]
+    if fragment is not None:
+        compiled.append(shaders.compileShader(fragment, GL_FRAGMENT_SHADER))
+    linked = glCreateProgram()
+    for shader in compiled:
+        glAttachShader(linked, shader)
+    glLinkProgram(linked)
+    for shader in compiled:
+        glDeleteShader(shader)
+    if not glGetProgramiv(linked, GL_LINK_STATUS):
+        log = glGetProgramInfoLog(linked)
+        glDeleteProgram(linked)
+        raise RuntimeError('unable to link: %s' % log)
+    return linked
+
+def configure(linked):
+    """Point a linked program's samplers at texture units 0 and 1 and set its
+    light and shadow uniforms.
+    
+    """
+    glUseProgram(linked)
+    for (name, unit) in (('image', 0), ('shadowMap', 1)):
+        location = glGetUniformLocation(linked, name)
+        if location >= 0:
+            glUniform1i(location, unit)
+    location = glGetUniformLocation(linked, 'shadowLight')
+    if location >= 0:
+        glUniform1f(location, SHADOW_LIGHT)
+    configured.append(linked)
+    apply_shadows(linked)
+    glUseProgram(0)
+
+def set_shadows(lights, shadows):
+    """Light from GL_LIGHT0 up to (not including) GL_LIGHT0 + lights, and
+    shadow through each (light, split, world space matrix) of shadows.
+    
+    """
+    global shadowing
+    modelview = numpy.asarray(glGetDoublev(GL_MODELVIEW_MATRIX)).T
+    world = numpy.linalg.inv(modelview) #eye space -> world space
+    shadowing = (min(lights, MAX_LIGHTS),
+                 [(light, split, numpy.dot(matrix, world))
+                  for (light, split, matrix) in shadows[0:MAX_SHADOWS]])
+    for linked in configured:
+        glUseProgram(linked)
+        apply_shadows(linked)
+    if configured:
+        resume()
+
+def apply_shadows(linked):
+    """Set the light and shadow uniforms (those it has) of a program in use."""
+    (lights, shadows) = shadowing
+    location = glGetUniformLocation(linked, 'lights')
+    if location >= 0:
+        glUniform1i(location, lights)
+    location = glGetUniformLocation(linked, 'shadows')
+    if location < 0:
+        return
+    glUniform1i(location, len(shadows))
+    if shadows:
+        (indices, splits, matrices) = zip(*shadows)
+        glUniform1iv(glGetUniformLocation(linked, 'shadowLights'),
+                len(shadows), numpy.array(indices, numpy.int32))
+        glUniform1fv(glGetUniformLocation(linked, 'splits'), len(shadows),
+                numpy.array(splits, numpy.float32))
+        glUniformMatrix4fv(glGetUniformLocation(linked, 'shadowMatrices'),
+                len(shadows), GL_FALSE, numpy.array([matrix.T for matrix in
+                matrices], numpy.float32))
+
+def begin():
+    """Put the program in use: what is drawn until end() is lit and shadowed in
+    one pass.
+    
+    """
+    global active
+    active = True
+    glUseProgram(program)
+
+def end():
+    """Undo begin()."""
+    global active
+    active = False
+    glUseProgram(0)
+
+def resume():
+    """Put the program back in use (if it was) after a draw with another."""
+    glUseProgram(program if active else 0)
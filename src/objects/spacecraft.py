@@ -35,6 +35,8 @@ class TIEFighter(gl_objects.GLMobileObject):
                 emissive=[0.0, 0.0, 0.0],
                 shininess=shininess)
         self.agility = 5
+        #the wings span y (either side) and z (above and below)
+        self.volume = gl_objects.Bounds([-2.0, -2.1, -3.0], [2.0, 2.1, 3.0])
         
         self.build()
     
@@ -50,7 +52,8 @@ class TIEFighter(gl_objects.GLMobileObject):
         #command pod
         glPushMatrix()
         glRotatef(90.0, 0.0, 0.0, 1.0)
-        gl_objects.Sphere([-math.pi * 0.3, math.pi / 2], [0, math.pi * 2]).draw()
+        gl_objects.Sphere([-math.pi * 0.3, math.pi / 2], [0, math.pi * 2],
+                n=32).draw()
         glPopMatrix()
         
         glPushMatrix()
@@ -203,31 +206,32 @@ class Wing(gl_objects.GLObject):
             [1.0, 1.0], #upper  right
             [0.0, 1.0]  #upper  left (again, completing the fan)
         ]
+        self.applyTexture = True
+        self.texture = textures.textures['wing']
+        self.region = textures.region('wing')
         
     def render_panel(self, polygonVertices, textureVertices):
         """Render a large, flat hexagon (an inner/outer panel of this Wing."""
         glBegin(GL_TRIANGLE_FAN)
         glNormal3f(-1.0, 0.0, 0.0)
         for index in range(len(polygonVertices)):
-            glTexCoord2f(*textureVertices[index])
+            self.tex_coord(*textureVertices[index])
             glVertex3f(*polygonVertices[index])
         glEnd()
     
     def render(self):
         """Render this Wing in 3 parts: inner panel, outer panel, edge."""
         glPushMatrix()
-        glEnable(GL_TEXTURE_2D)
-        glBindTexture(GL_TEXTURE_2D, textures.textures['wing'])
-        glTexEnvf(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_MODULATE)
-        
         self.render_panel(self.polygonVertices, self.textureVertices) #inner
         glTranslatef(0.1, 0.0, 0.0)
         glRotatef(180.0, 0.0, 0.0, 1.0)
         self.render_panel(self.polygonVertices, self.textureVertices) #outer
-        glBindTexture(GL_TEXTURE_2D, 0)
         glPopMatrix()
         
-        #edge
+        #edge (untextured; unbound too, for shading)
+        glPushAttrib(GL_ENABLE_BIT | GL_TEXTURE_BIT)
+        glDisable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, 0)
         glPushMatrix()
         v = self.polygonVertices + [self.polygonVertices[0]]
         edges = lambda v: itertools.izip(v,
@@ -236,5 +240,5 @@ class Wing(gl_objects.GLObject):
         for vertex in [a for b in edges(v) for a in b]:
             glVertex3f(*vertex);
         glEnd()
-        glDisable(GL_TEXTURE_2D)
         glPopMatrix()
+        glPopAttrib()
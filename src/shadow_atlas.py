@@ -0,0 +1,138 @@
+"""Shadow atlas: one depth texture holding the shadow maps of many light views
+(lights and cascades) as square tiles, each redrawn only when it changes."""
+__author__ = "Micah Larson"
+__date__   = "$Oct 16, 2026 11:31:09 PM$"
+
+from OpenGL.GL import *                     #@UnusedWildImport
+from OpenGL.GL.framebufferobjects import *  #@UnusedWildImport
+from OpenGL.GL.EXT.framebuffer_blit import * #@UnusedWildImport
+
+import math
+
+import numpy
+
+def finish_frame_buffer():
+    """Set the bound depth-only frame buffer up to draw no color, check it is
+    complete (raising if not) and unbind it.
+    
+    """
+    glDrawBuffer(GL_NONE)
+    glReadBuffer(GL_NONE)
+    status = glCheckFramebufferStatusEXT(GL_FRAMEBUFFER_EXT)
+    glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, 0)
+    if status != GL_FRAMEBUFFER_COMPLETE_EXT:
+        raise Exception('Error setting up shadow atlas frame buffer')
+
+class Tile(object):
+    """A square of a ShadowAtlas, and the state its depth was drawn in."""
+    def __init__(self, x, y, size):
+        """Constructor"""
+        super(Tile, self).__init__()
+        self.viewport = (x, y, size, size)
+        self.staticState = None #view and static casters of the cached depth
+        self.state = None #those and the dynamic casters of the drawn depth
+
+
+class ShadowAtlas(object):
+    """A depth texture split into square tiles, with a frame buffer that draws
+    into it and another that caches each tile's static casters.
+    
+    """
+    def __init__(self):
+        """Constructor"""
+        super(ShadowAtlas, self).__init__()
+        self.texture = 0
+        self.frameBuffer = 0 #draws into self.texture
+        self.staticFrameBuffer = 0 #caches the static casters' depth
+        self.renderBuffer = 0 #the depth self.staticFrameBuffer draws into
+        self.size = None #(width, height) of the texture
+        self.tileSize = 0
+        self.tiles = []
+    
+    def init(self, count, tileSize, maximum):
+        """Lay out count tiles of tileSize texels (at most maximum texels
+        across), (re)allocating the texture if its size changes.
+        
+        """
+        columns = int(math.ceil(math.sqrt(count)))
+        rows = int(math.ceil(count / float(columns)))
+        tileSize = min(tileSize, maximum // columns)
+        size = (columns * tileSize, rows * tileSize)
+        if (len(self.tiles), self.tileSize) != (count, tileSize):
+            self.tileSize = tileSize
+            self.tiles = [Tile((i % columns) * tileSize,
+                               (i // columns) * tileSize, tileSize)
+                          for i in xrange(count)]
+        if size == self.size:
+            return
+        if self.texture == 0:
+            self.texture = glGenTextures(1)
+            self.frameBuffer = glGenFramebuffersEXT(1)
+            self.staticFrameBuffer = glGenFramebuffersEXT(1)
+            self.renderBuffer = glGenRenderbuffersEXT(1)
+        glPushAttrib(GL_TEXTURE_BIT)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_DEPTH_COMPONENT32, size[0], size[1],
+            0, GL_DEPTH_COMPONENT, GL_UNSIGNED_INT, None)
+        glTexParameteri(GL_TEXTURE_2D, GL_DEPTH_TEXTURE_MODE, GL_INTENSITY)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glPopAttrib()
+        glBindRenderbufferEXT(GL_RENDERBUFFER_EXT, self.renderBuffer)
+        glRenderbufferStorageEXT(GL_RENDERBUFFER_EXT, GL_DEPTH_COMPONENT32,
+            size[0], size[1])
+        
+        glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, self.frameBuffer)
+        glFramebufferTexture2DEXT(GL_FRAMEBUFFER_EXT, GL_DEPTH_ATTACHMENT_EXT,
+            GL_TEXTURE_2D, self.texture, 0)
+        finish_frame_buffer()
+        glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, self.staticFrameBuffer)
+        glFramebufferRenderbufferEXT(GL_FRAMEBUFFER_EXT,
+            GL_DEPTH_ATTACHMENT_EXT, GL_RENDERBUFFER_EXT, self.renderBuffer)
+        finish_frame_buffer()
+        self.size = size
+        for tile in self.tiles:
+            tile.staticState = tile.state = None
+    
+    def begin_static(self, tile):
+        """Clear a tile's cached depth and direct drawing into it."""
+        glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, self.staticFrameBuffer)
+        glViewport(*tile.viewport)
+        glPushAttrib(GL_ENABLE_BIT | GL_SCISSOR_BIT)
+        glEnable(GL_SCISSOR_TEST)
+        glScissor(*tile.viewport)
+        glClear(GL_DEPTH_BUFFER_BIT)
+        glPopAttrib()
+    
+    def begin(self, tile):
+        """Copy a tile's cached depth into the texture and direct drawing
+        into the tile there.
+        
+        """
+        (x, y, width, height) = tile.viewport
+        glBindFramebufferEXT(GL_READ_FRAMEBUFFER_EXT, self.staticFrameBuffer)
+        glBindFramebufferEXT(GL_DRAW_FRAMEBUFFER_EXT, self.frameBuffer)
+        glBlitFramebufferEXT(x, y, x + width, y + height,
+                x, y, x + width, y + height, GL_DEPTH_BUFFER_BIT, GL_NEAREST)
+        glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, self.frameBuffer)
+        glViewport(*tile.viewport)
+    
+    def end(self):
+        """Direct drawing back to the window."""
+        glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, 0)
+    
+    def texture_matrix(self, tile, projection, modelview):
+        """Return the row major matrix from world space to a tile's texture
+        coordinates.
+        
+        """
+        (x, y, size, size) = tile.viewport
+        (width, height) = self.size
+        matrix = numpy.identity(4)
+        matrix[0] = [0.5 * size / width, 0.0, 0.0, (x + 0.5 * size) / width]
+        matrix[1] = [0.0, 0.5 * size / height, 0.0, (y + 0.5 * size) / height]
+        matrix[2] = [0.0, 0.0, 0.5, 0.5]
+        return numpy.dot(matrix, numpy.dot(numpy.asarray(projection).T,
+                numpy.asarray(modelview).T))
@@ -0,0 +1,356 @@
+"""Spatial index of scene objects: a dynamic bounding volume hierarchy."""
+__author__ = "Micah Larson"
+__date__   = "$Oct 16, 2026 4:48:02 PM$"
+
+import math
+
+import numpy
+
+MARGIN = 5.0 #scene units leaf boxes are fattened by, so small moves are free
+OUTSIDE, STRADDLING, INSIDE = -1, 0, 1 #a box against a frustum (see classify())
+
+class Node(object):
+    """A node of a SpatialIndex: a leaf holding one object (and its tight
+    box), or the parent of two children; its box holds everything below it.
+    
+    """
+    def __init__(self, lower, upper, object=None, tight=None):
+        """Constructor"""
+        super(Node, self).__init__()
+        self.lower = lower #(x, y, z)
+        self.upper = upper
+        self.parent = None
+        self.children = None #(left, right), unless a leaf
+        self.object = object
+        self.tight = tight #(lower, upper) of a leaf's object
+
+
+class SpatialIndex(object):
+    """Bounding volume hierarchy over scene objects (anything with
+    scene_bounds()), with fattened leaves so small moves leave the tree alone.
+    
+    """
+    def __init__(self, margin=MARGIN):
+        """Constructor"""
+        super(SpatialIndex, self).__init__()
+        self.margin = margin
+        self.root = None
+        self.leaves = {}    #object -> leaf Node
+        self.unbounded = [] #objects without bounds
+    
+    def __len__(self):
+        """Return the number of objects in this SpatialIndex."""
+        return len(self.leaves) + len(self.unbounded)
+    
+    def __contains__(self, object):
+        """Return whether object is in this SpatialIndex."""
+        return object in self.leaves or object in self.unbounded
+    
+    def build(self, objects):
+        """Replace the contents of this SpatialIndex with objects, bulk loaded
+        into a balanced tree.
+        
+        """
+        (self.root, self.leaves, self.unbounded) = (None, {}, [])
+        leaves = []
+        for object in objects:
+            bounds = object.scene_bounds()
+            if bounds is None:
+                self.unbounded.append(object)
+            else:
+                self.leaves[object] = self.make_leaf(object, bounds)
+                leaves.append(self.leaves[object])
+        if leaves:
+            centers = numpy.array([leaf.lower + leaf.upper for leaf in leaves],
+                    numpy.float64).reshape(-1, 2, 3).sum(axis=1) / 2
+            self.root = self.build_node(leaves, centers,
+                    numpy.arange(len(leaves)))
+    
+    def build_node(self, leaves, centers, indices):
+        """Return the root of a balanced tree over the indexed leaves."""
+        if len(indices) == 1:
+            return leaves[indices[0]]
+        points = centers[indices]
+        axis = (points.max(axis=0) - points.min(axis=0)).argmax()
+        half = len(indices) // 2
+        order = numpy.argpartition(points[:, axis], half)
+        return self.join(
+                self.build_node(leaves, centers, indices[order[:half]]),
+                self.build_node(leaves, centers, indices[order[half:]]))
+    
+    def make_leaf(self, object, bounds):
+        """Return a leaf Node for object, fattened around its Bounds."""
+        lower = tuple(bounds.lower.tolist())
+        upper = tuple(bounds.upper.tolist())
+        return Node(tuple(x - self.margin for x in lower),
+                tuple(x + self.margin for x in upper), object, (lower, upper))
+    
+    def join(self, left, right):
+        """Return a new parent Node of two (parentless) Nodes."""
+        node = Node(*union(left, right))
+        node.children = (left, right)
+        (left.parent, right.parent) = (node, node)
+        return node
+    
+    def insert(self, object, bounds=None):
+        """Add object (at bounds, default its scene_bounds())."""
+        if bounds is None:
+            bounds = object.scene_bounds()
+        if bounds is None:
+            self.unbounded.append(object)
+            return
+        self.leaves[object] = self.make_leaf(object, bounds)
+        self.insert_leaf(self.leaves[object])
+    
+    def insert_leaf(self, leaf):
+        """Link a leaf into the tree beside the Node whose box (with the
+        leaf's) adds the least surface area to the tree, and refit above it.
+        
+        """
+        if self.root is None:
+            self.root = leaf
+            return
+        node = self.root
+        while node.children is not None:
+            combined = surface(*union(node, leaf))
+            #growth of every ancestor, were the leaf to go further down
+            inherited = 2 * (combined - surface(node.lower, node.upper))
+            costs = []
+            for child in node.children:
+                grown = surface(*union(child, leaf))
+                if child.children is not None:
+                    grown -= surface(child.lower, child.upper)
+                costs.append(grown + inherited)
+            if 2 * combined < min(costs):
+                break #cheapest to pair the leaf with this node itself
+            node = node.children[0 if costs[0] <= costs[1] else 1]
+        parent = node.parent
+        joined = self.join(node, leaf)
+        joined.parent = parent
+        if parent is None:
+            self.root = joined
+        else:
+            parent.children = tuple(joined if child is node else child
+                                    for child in parent.children)
+            refit(parent)
+    
+    def remove(self, object):
+        """Take object out of this SpatialIndex."""
+        if object in self.unbounded:
+            self.unbounded.remove(object)
+        else:
+            self.remove_leaf(self.leaves.pop(object))
+    
+    def remove_leaf(self, leaf):
+        """Unlink a leaf from the tree; its sibling takes its parent's place."""
+        parent = leaf.parent
+        leaf.parent = None
+        if parent is None:
+            self.root = None
+            return
+        sibling = [child for child in parent.children if child is not leaf][0]
+        grandparent = parent.parent
+        sibling.parent = grandparent
+        if grandparent is None:
+            self.root = sibling
+        else:
+            grandparent.children = tuple(sibling if child is parent else child
+                                         for child in grandparent.children)
+            refit(grandparent)
+    
+    def move(self, object, bounds=None):
+        """Update where object is (at bounds, default its scene_bounds()).  It
+        only moves in the tree if it has escaped its leaf's fattened box.
+        
+        """
+        if bounds is None:
+            bounds = object.scene_bounds()
+        leaf = self.leaves.get(object)
+        if leaf is None or bounds is None:
+            self.remove(object)
+            self.insert(object, bounds)
+            return
+        leaf.tight = (tuple(bounds.lower.tolist()),
+                      tuple(bounds.upper.tolist()))
+        if contains(leaf.lower, leaf.upper, *leaf.tight):
+            return
+        self.remove_leaf(leaf)
+        self.leaves[object] = self.make_leaf(object, bounds)
+        self.insert_leaf(self.leaves[object])
+    
+    def bound(self):
+        """Index the unbounded objects that have since gained bounds (such
+        as Asteroids whose models were only compiled once drawn).
+        
+        """
+        for object in list(self.unbounded):
+            if object.scene_bounds() is not None:
+                self.move(object)
+    
+    def objects(self, node):
+        """Return the objects in the leaves under node."""
+        found = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.children is None:
+                found.append(node.object)
+            else:
+                stack.extend(node.children)
+        return found
+    
+    def query(self, test):
+        """Return the objects whose leaves pass test(lower, upper), a test of
+        boxes that every box holding a passing box also passes.
+        
+        """
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            if not test(node.lower, node.upper):
+                continue
+            if node.children is None:
+                if test(*node.tight):
+                    found.append(node.object)
+            else:
+                stack.extend(node.children)
+        return found
+    
+    def query_frustum(self, planes):
+        """Return the objects at least partly inside the planes of a frustum,
+        and every object without bounds.
+        
+        """
+        planes = [tuple(float(x) for x in plane) for plane in planes]
+        found = list(self.unbounded)
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            side = classify(node.lower, node.upper, planes)
+            if side == OUTSIDE:
+                continue
+            if node.children is None:
+                if classify(node.tight[0], node.tight[1], planes) != OUTSIDE:
+                    found.append(node.object)
+            elif side == INSIDE:
+                found.extend(self.objects(node))
+            else:
+                stack.extend(node.children)
+        return found
+    
+    def query_sphere(self, center, radius):
+        """Return the objects whose boxes reach within radius of center."""
+        center = tuple(float(x) for x in center[0:3])
+        squared = float(radius) ** 2
+        return self.query(lambda lower, upper:
+                box_distance2(lower, upper, center) <= squared)
+    
+    def query_box(self, lower, upper):
+        """Return the objects whose boxes overlap the box (lower, upper)."""
+        box = (tuple(float(x) for x in lower[0:3]),
+               tuple(float(x) for x in upper[0:3]))
+        return self.query(lambda lower, upper: overlaps(lower, upper, *box))
+    
+    def query_ray(self, origin, direction, length=float('inf')):
+        """Return (distance, object) for each object whose box a ray enters
+        within length, nearest first.
+        
+        """
+        norm = math.sqrt(sum(x * x for x in direction[0:3]))
+        if norm == 0.0:
+            return []
+        origin = tuple(float(x) for x in origin[0:3])
+        inverse = tuple(norm / x if x != 0.0 else None for x in direction[0:3])
+        hits = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            if ray_distance(origin, inverse, node.lower, node.upper,
+                    length) is None:
+                continue
+            if node.children is None:
+                distance = ray_distance(origin, inverse, node.tight[0],
+                        node.tight[1], length)
+                if distance is not None:
+                    hits.append((distance, node.object))
+            else:
+                stack.extend(node.children)
+        hits.sort(key=lambda hit: hit[0])
+        return hits
+
+
+def union(a, b):
+    """Return (lower, upper) of the box holding the boxes of Nodes a and b."""
+    (p, q, r, s) = (a.lower, b.lower, a.upper, b.upper)
+    return ((min(p[0], q[0]), min(p[1], q[1]), min(p[2], q[2])),
+            (max(r[0], s[0]), max(r[1], s[1]), max(r[2], s[2])))
+
+def refit(node):
+    """Recompute the boxes of node and its ancestors from their children."""
+    while node is not None:
+        (node.lower, node.upper) = union(*node.children)
+        node = node.parent
+
+def surface(lower, upper):
+    """Return (half) the surface area of a box."""
+    (x, y, z) = (upper[0] - lower[0], upper[1] - lower[1], upper[2] - lower[2])
+    return x * y + y * z + z * x
+
+def contains(lower, upper, innerLower, innerUpper):
+    """Return whether the box (lower, upper) holds the inner box."""
+    return (all(x <= y for (x, y) in zip(lower, innerLower)) and
+            all(x >= y for (x, y) in zip(upper, innerUpper)))
+
+def overlaps(lower, upper, otherLower, otherUpper):
+    """Return whether two boxes overlap."""
+    return (all(x <= y for (x, y) in zip(lower, otherUpper)) and
+            all(x >= y for (x, y) in zip(upper, otherLower)))
+
+def box_distance2(lower, upper, point):
+    """Return the squared distance from a point to the nearest of a box."""
+    total = 0.0
+    for (low, high, x) in zip(lower, upper, point):
+        if x < low:
+            total += (low - x) ** 2
+        elif x > high:
+            total += (x - high) ** 2
+    return total
+
+def classify(lower, upper, planes):
+    """Return whether a box is OUTSIDE, INSIDE or STRADDLING the planes
+    (of a frustum, see SpatialIndex.query_frustum()).
+    
+    """
+    side = INSIDE
+    for (a, b, c, d) in planes:
+        #the corners farthest along and against the plane's normal
+        if (a * (upper[0] if a >= 0 else lower[0]) +
+                b * (upper[1] if b >= 0 else lower[1]) +
+                c * (upper[2] if c >= 0 else lower[2]) + d < 0):
+            return OUTSIDE
+        if (a * (lower[0] if a >= 0 else upper[0]) +
+                b * (lower[1] if b >= 0 else upper[1]) +
+                c * (lower[2] if c >= 0 else upper[2]) + d < 0):
+            side = STRADDLING
+    return side
+
+def ray_distance(origin, inverse, lower, upper, length):
+    """Return the distance (clamped to 0) at which a ray enters a box, or None
+    if it misses within length.
+    
+    """
+    (near, far) = (0.0, length)
+    for axis in xrange(3):
+        if inverse[axis] is None:
+            if not lower[axis] <= origin[axis] <= upper[axis]:
+                return None
+            continue
+        t0 = (lower[axis] - origin[axis]) * inverse[axis]
+        t1 = (upper[axis] - origin[axis]) * inverse[axis]
+        if t0 > t1:
+            (t0, t1) = (t1, t0)
+        (near, far) = (max(near, t0), min(far, t1))
+        if near > far:
+            return None
+    return near
@@ -5,8 +5,28 @@ __date__   = "$Mar 26, 2011 7:17:22 PM$"
 from OpenGL.GL import *   #@UnusedWildImport
 from OpenGL.GLU import *  #@UnusedWildImport
 from OpenGL.GLUT import * #@UnusedWildImport
+from OpenGL.GL.EXT.texture_compression_s3tc import * #@UnusedWildImport
+#unwrapped, so the last argument can be an offset into a pixel buffer
+from OpenGL.raw.GL.VERSION.GL_1_1 import glTexSubImage2D as \
+        glTexSubImage2DOffset
+from OpenGL.raw.GL.VERSION.GL_1_3 import glCompressedTexSubImage2D as \
+        glCompressedTexSubImage2DOffset
+from OpenGL.raw.GL.VERSION.GL_1_3 import glGetCompressedTexImage as \
+        glGetCompressedTexImageInto
 from PIL import Image
 
+import ctypes
+import functools
+import hashlib
+import math
+import multiprocessing.pool
+import time
+
+import numpy
+
+import cache
+import util
+
 #format of pixel data
 formats = {
     'RGB':  GL_RGB,
@@ -16,32 +36,341 @@ formats = {
 BORDER = 0                #BORDER width; 0 = no BORDER
 INTERNAL_FORMAT = GL_RGB  #number of color components in the texture
 LEVEL = 0                 #LEVEL-of-detail; 0 = base image
+CACHE_VERSION = 2         #increment whenever the cached pixels change meaning
+COMPRESS = True           #use S3TC compressed 2D textures where supported
+STREAM_THREADS = 2        #worker threads decoding streamed textures
+STREAM_BYTES = 1 << 20    #bytes of texture data streamed in per frame
+STREAM_BUFFERS = 3        #pixel buffer objects in the streaming ring
+ATLAS_WIDTH = 512         #least width of the texture atlas (it grows in height)
+ATLAS_PADDING = 8         #edge texels around (and alignment of) atlas images
+
+#S3TC format (and cache entry suffix) of INTERNAL_FORMAT
+COMPRESSED_FORMAT = (GL_COMPRESSED_RGB_S3TC_DXT1_EXT, 'dxt1')
+
+#small 2D textures, packed together into one atlas texture
+ATLAS_FILES = ['asteroid_01.png', 'asteroid_02.png', 'command_pod.png',
+               'wing.bmp']
+FULL_REGION = (0.0, 0.0, 1.0, 1.0) #(s0, t0, s1, t1) of a whole texture
 
 TEXTURE_PATH = os.path.join('..', 'etc', 'textures') #assumes running from src
 textures = {}
+regions = {} #name -> (s0, t0, s1, t1) of a texture packed into an atlas
+stream = None #TextureStream, if init() was asked to stream
+
+def region(name):
+    """Return the (s0, t0, s1, t1) texture coordinates of the named texture
+    within the texture it is bound as (all of it, unless it is in an atlas).
+    
+    """
+    return regions.get(name, FULL_REGION)
+
 
 def load_2D_texture(path):
-    """Load a texture from an image and return the texture name."""
-    ((width, height), format, pixel_data) = load_image(path)
+    """Load a mipmapped texture from an image and return the texture name."""
+    name = os.path.basename(path).rsplit('.', 1)[0]
+    return create_2D_texture(name, *load_mipmaps(path))
+
+
+def create_2D_texture(name, format, levels, key):
+    """Create a mipmapped texture from pixel levels (S3TC compressed, where
+    supported) and return the texture name.
+    
+    """
+    (height, width) = levels[0].shape[0:2]
     
     texture = glGenTextures(1)
     glBindTexture(GL_TEXTURE_2D, texture)
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1) #rows of pixel_data are not padded
     
-    #scale linearly when image size doesn't match
+    #scale linearly, blending the two nearest mipmaps when minifying
     glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP)
     glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP)
     glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER,
+            GL_LINEAR_MIPMAP_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, len(levels) - 1)
     
-    #copy image
-    glTexImage2D(GL_TEXTURE_2D, LEVEL, INTERNAL_FORMAT, width, height, BORDER,
-            format, GL_UNSIGNED_BYTE, pixel_data)
+    #copy image (and its mipmaps)
+    compressed = compressed_format()
+    if compressed is None:
+        size = upload_levels(levels, format, INTERNAL_FORMAT)
+        kind = 'uncompressed'
+    else:
+        size = upload_compressed_levels(name, key, levels, format, *compressed)
+        kind = compressed[1]
     if glGetError():
-        raise Exception('Error loading %s, (%dx%d)' % (path, width, height))
+        raise Exception('Error loading %s, (%dx%d)' % (name, width, height))
     
+    #level 0 alone, uncompressed, is what a plain upload would have used
+    print '    %dx%d: %d KB -> %d KB (%d levels, %s)' % (width, height,
+            width * height * components(INTERNAL_FORMAT) >> 10, size >> 10,
+            len(levels), kind)
     return texture #texture name
 
 
+def compressed_format():
+    """Return COMPRESSED_FORMAT, or None if compression is off or the
+    driver lacks S3TC.
+    
+    """
+    extensions = (glGetString(GL_EXTENSIONS) or '').split()
+    if not COMPRESS or 'GL_EXT_texture_compression_s3tc' not in extensions:
+        return None
+    return COMPRESSED_FORMAT
+
+
+def components(format):
+    """Return the number of bytes per pixel of an uncompressed format."""
+    return 4 if format == GL_RGBA else 3
+
+
+def upload_levels(levels, format, internalFormat):
+    """Upload pixel levels to the bound 2D texture; return their size (in
+    bytes) on the GPU.
+    
+    """
+    size = 0
+    for (level, pixels) in enumerate(levels):
+        (height, width) = pixels.shape[0:2]
+        glTexImage2D(GL_TEXTURE_2D, level, internalFormat, width, height,
+                BORDER, format, GL_UNSIGNED_BYTE, pixels)
+        size += width * height * components(internalFormat)
+    return size
+
+
+def upload_compressed_levels(name, key, levels, format, internalFormat,
+                             suffix):
+    """Upload pixel levels to the bound 2D texture in a compressed format;
+    return their compressed size (in bytes).
+    
+    """
+    compressed = read_compressed(name, key, suffix)
+    if compressed is not None:
+        for (level, (pixels, data)) in enumerate(zip(levels, compressed)):
+            (height, width) = pixels.shape[0:2]
+            glCompressedTexImage2D(GL_TEXTURE_2D, level, internalFormat,
+                    width, height, BORDER, data)
+        return sum(data.nbytes for data in compressed)
+    size = upload_levels(levels, format, internalFormat)
+    return save_compressed(name, key, suffix, len(levels)) or size
+
+
+def read_compressed(name, key, suffix):
+    """Return the cached compressed levels of an image (1-D arrays of bytes),
+    or None if there are none.
+    
+    """
+    contents = cache.read(cache.entry('textures', '%s.%s' % (name, suffix),
+            key))
+    if contents is None or contents[0]['version'] != CACHE_VERSION:
+        return None
+    arrays = contents[1]
+    return [arrays[level] for level in sorted(arrays)]
+
+
+def save_compressed(name, key, suffix, count):
+    """Read back and cache the first count levels of the bound 2D texture as
+    the driver compressed them; return their size (or None).
+    
+    """
+    if not glGetTexLevelParameteriv(GL_TEXTURE_2D, 0, GL_TEXTURE_COMPRESSED):
+        return None
+    arrays = {}
+    for level in xrange(count):
+        data = numpy.zeros(glGetTexLevelParameteriv(GL_TEXTURE_2D, level,
+                GL_TEXTURE_COMPRESSED_IMAGE_SIZE), numpy.uint8)
+        glGetCompressedTexImageInto(GL_TEXTURE_2D, level,
+                ctypes.c_void_p(data.ctypes.data))
+        arrays['level%02d' % level] = data
+    try:
+        cache.write(cache.entry('textures', '%s.%s' % (name, suffix), key),
+                arrays, {'version': CACHE_VERSION})
+    except EnvironmentError as error:
+        print >> sys.stderr, 'save_compressed> unable to cache %s.%s: %s' % (
+                name, suffix, error)
+    return sum(array.nbytes for array in arrays.values())
+
+
+def decode_texture(name, load, compressed):
+    """Load the named texture's pixels (and any cached compressed levels) on a
+    worker thread; makes no OpenGL calls.
+    
+    """
+    (format, levels, key) = load()
+    data = None
+    if compressed is not None:
+        data = read_compressed(name, key, compressed[1])
+    return name, format, levels, key, data
+
+
+class TextureUpload(object):
+    """A texture being streamed in by a TextureStream, coarsest level first."""
+    def __init__(self, texture, start, decoded):
+        """Constructor"""
+        super(TextureUpload, self).__init__()
+        (self.name, self.format, self.levels, self.key,
+                self.compressedLevels) = decoded
+        self.texture = texture
+        self.start = start  #time the image was queued
+        self.level = None   #level being uploaded; None until allocated
+        self.row = 0        #next row of that level
+        self.bytes = 0      #bytes uploaded so far
+    
+    def data(self, level):
+        """Return the data (compressed, if cached) uploaded for a level."""
+        if self.compressedLevels is not None:
+            return self.compressedLevels[level]
+        return self.levels[level]
+
+
+class TextureStream(object):
+    """Streams 2D textures in without blocking: decoded on worker threads, then
+    uploaded coarsest level first through a ring of pixel buffers.
+    
+    """
+    def __init__(self, threads=STREAM_THREADS, budget=STREAM_BYTES,
+                 buffers=STREAM_BUFFERS):
+        """Constructor"""
+        super(TextureStream, self).__init__()
+        self.pool = multiprocessing.pool.ThreadPool(threads)
+        self.budget = budget #bytes uploaded per update()
+        self.buffers = numpy.atleast_1d(glGenBuffers(buffers)).tolist()
+        self.next = 0 #index of the next buffer of the ring to fill
+        self.compressed = compressed_format()
+        self.pending = [] #(texture, start, AsyncResult) being decoded
+        self.uploads = [] #TextureUploads, in the order they were decoded
+    
+    def load(self, name, load):
+        """Queue the named texture and return the name of its texture, a 1x1
+        placeholder until it streams in.
+        
+        """
+        texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexImage2D(GL_TEXTURE_2D, LEVEL, INTERNAL_FORMAT, 1, 1, BORDER,
+                GL_RGB, GL_UNSIGNED_BYTE, numpy.array([128] * 3, numpy.uint8))
+        self.pending.append((texture, time.time(), self.pool.apply_async(
+                decode_texture, (name, load, self.compressed))))
+        return texture
+    
+    def busy(self):
+        """Return True if any texture has yet to stream in."""
+        return bool(self.pending or self.uploads)
+    
+    def update(self):
+        """Start uploading the images that have been decoded, and upload the
+        next bands of rows, up to the budget (at least one band).
+        
+        """
+        for (texture, start, result) in [item for item in self.pending
+                                         if item[2].ready()]:
+            self.pending.remove((texture, start, result))
+            try:
+                self.uploads.append(TextureUpload(texture, start,
+                        result.get()))
+            except Exception as error:
+                print >> sys.stderr, 'update> unable to stream texture: %s' % (
+                        error)
+        if not self.uploads:
+            return
+        
+        glPushAttrib(GL_TEXTURE_BIT)
+        glPushClientAttrib(GL_CLIENT_PIXEL_STORE_BIT)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1) #rows of pixel_data are not padded
+        spent = 0
+        while self.uploads and spent < self.budget:
+            upload = self.uploads[0]
+            glBindTexture(GL_TEXTURE_2D, upload.texture)
+            spent += self.upload_band(upload, self.budget - spent)
+            if upload.level < 0:
+                self.finish(upload)
+                self.uploads.pop(0)
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        glPopClientAttrib()
+        glPopAttrib()
+    
+    def upload_band(self, upload, allowance):
+        """Upload the next band of rows of a (bound) texture, about allowance
+        bytes; return the bytes uploaded.
+        
+        """
+        internalFormat = INTERNAL_FORMAT
+        if self.compressed is not None:
+            internalFormat = self.compressed[0]
+        if upload.level is None:
+            #allocate every level, then sample none but the coarsest
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+            last = len(upload.levels) - 1
+            for (level, pixels) in enumerate(upload.levels):
+                (height, width) = pixels.shape[0:2]
+                glTexImage2D(GL_TEXTURE_2D, level, internalFormat, width,
+                        height, BORDER, upload.format, GL_UNSIGNED_BYTE, None)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER,
+                    GL_LINEAR_MIPMAP_LINEAR)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, last)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_BASE_LEVEL, last)
+            (upload.level, upload.row) = (last, 0)
+        
+        (height, width) = upload.levels[upload.level].shape[0:2]
+        data = upload.data(upload.level)
+        #compressed formats are sent in whole rows of 4x4 blocks
+        step = 1 if self.compressed is None else 4
+        if upload.compressedLevels is not None:
+            blockRow = data.nbytes // -(-height // 4) #bytes per row of blocks
+            rows = allowance * 4 // blockRow
+        else:
+            rows = allowance // (data.nbytes // height)
+        end = min(height, upload.row + max(step, rows // step * step))
+        if upload.compressedLevels is not None:
+            band = data[upload.row // 4 * blockRow:-(-end // 4) * blockRow]
+        else:
+            band = data[upload.row:end]
+        
+        buffer = self.buffers[self.next]
+        self.next = (self.next + 1) % len(self.buffers)
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, buffer)
+        #orphan the buffer's last contents rather than wait for them
+        glBufferData(GL_PIXEL_UNPACK_BUFFER, band.nbytes, None, GL_STREAM_DRAW)
+        ctypes.memmove(glMapBuffer(GL_PIXEL_UNPACK_BUFFER, GL_WRITE_ONLY),
+                band.ctypes.data, band.nbytes)
+        glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER)
+        if upload.compressedLevels is not None:
+            glCompressedTexSubImage2DOffset(GL_TEXTURE_2D, upload.level, 0,
+                    upload.row, width, end - upload.row, internalFormat,
+                    band.nbytes, ctypes.c_void_p(0))
+        else:
+            glTexSubImage2DOffset(GL_TEXTURE_2D, upload.level, 0, upload.row,
+                    width, end - upload.row, upload.format, GL_UNSIGNED_BYTE,
+                    ctypes.c_void_p(0))
+        upload.bytes += band.nbytes
+        upload.row = end
+        if end == height:
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_BASE_LEVEL, upload.level)
+            (upload.level, upload.row) = (upload.level - 1, 0)
+        return band.nbytes
+    
+    def finish(self, upload):
+        """Report (and, if the driver compressed it, cache) a streamed
+        texture.
+        
+        """
+        kind = 'uncompressed'
+        if self.compressed is not None:
+            kind = self.compressed[1]
+            if upload.compressedLevels is None:
+                glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+                save_compressed(upload.name, upload.key, self.compressed[1],
+                        len(upload.levels))
+        (height, width) = upload.levels[0].shape[0:2]
+        print '%s> streamed %s: %dx%d, %d KB (%s) in %0.3f s' % (__name__,
+                upload.name, width, height, upload.bytes >> 10, kind,
+                time.time() - upload.start)
+
+
 def load_cube_textures():
     """Load textures and assign them to the cube map."""
     data = {}
@@ -60,6 +389,7 @@ def load_cube_textures():
     }
     
     glBindTexture(GL_TEXTURE_CUBE_MAP, glGenTextures(1))
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1) #rows of pixel_data are not padded
     
     glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_DECAL)
     glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
@@ -77,19 +407,186 @@ def load_cube_textures():
 
 
 def load_image(path):
-    """Load image. Returns (width, height, format, pixel_data)."""
-    image = Image.open(path)
-    return image.size[0:2], formats[image.mode], image.tostring()
+    """Load image. Returns ((width, height), format, pixel_data), where
+    pixel_data is the first of the image's mipmap levels (see load_mipmaps()).
+    
+    """
+    (format, levels, key) = load_mipmaps(path)
+    (height, width) = levels[0].shape[0:2]
+    return (width, height), format, levels[0]
+
+
+def load_mipmaps(path):
+    """Load an image and its mipmaps, cached under the image's digest; returns
+    (format, levels, key).
+    
+    """
+    name = os.path.basename(path).rsplit('.', 1)[0]
+    def decode():
+        image = Image.open(path)
+        return image.mode, numpy.asarray(image, numpy.uint8)
+    return cached_mipmaps(name, cache.digest(path), decode)
+
+
+def cached_mipmaps(name, key, decode):
+    """Return (format, levels, key) of the named pixels from the cache, or
+    build them from decode() and cache them.
+    
+    """
+    entry = cache.entry('textures', name, key)
+    contents = cache.read(entry)
+    if contents is not None and contents[0]['version'] == CACHE_VERSION:
+        (header, arrays) = contents
+        levels = [arrays[level] for level in sorted(arrays)]
+    else:
+        (mode, pixels) = decode()
+        header = {'version': CACHE_VERSION, 'mode': mode}
+        levels = build_mipmaps(pixels)
+        try:
+            cache.write(entry, dict(('level%02d' % level, pixels)
+                    for (level, pixels) in enumerate(levels)), header)
+        except EnvironmentError as error:
+            print >> sys.stderr, 'cached_mipmaps> unable to cache %s: %s' % (
+                    name, error)
+    return formats[header['mode']], levels, key
 
 
-def init():
-    """Load textures into the dictionary and cube map."""
-    print '%s> loading 2D textures:' % __name__
-    for file in ['asteroid_01.png', 'asteroid_02.png', 'command_pod.png',
-                 'earth.png', 'wing.bmp']:
+def build_mipmaps(pixels):
+    """Return the 2x2 box-filtered mipmap levels of a (height, width,
+    components) array of bytes, down to 1x1.
+    
+    """
+    levels = [pixels]
+    while max(pixels.shape[0:2]) > 1:
+        sums = pixels.astype(numpy.uint16)
+        for axis in (0, 1):
+            count = sums.shape[axis]
+            even = 2 * numpy.arange(max(1, count // 2))
+            sums = sums.take(even, axis) + sums.take(numpy.minimum(even + 1,
+                    count - 1), axis)
+        pixels = ((sums + 2) // 4).astype(numpy.uint8)
+        levels.append(pixels)
+    return levels
+
+
+def pack(sizes, width, padding):
+    """Shelf-pack images of (width, height) sizes into rows; returns (width,
+    height, positions).
+    
+    """
+    align = lambda n: -(-n // padding) * padding
+    width = int(util.upper_power_of_two(max([width] +
+            [align(w + 2 * padding) for (w, h) in sizes])))
+    positions = [None] * len(sizes)
+    (x, y, shelf) = (0, 0, 0)
+    for i in sorted(xrange(len(sizes)), key=lambda i: -sizes[i][1]):
+        (w, h) = (align(sizes[i][0] + 2 * padding),
+                  align(sizes[i][1] + 2 * padding))
+        if x + w > width:
+            (x, y, shelf) = (0, y + shelf, 0)
+        positions[i] = (x + padding, y + padding)
+        x += w
+        shelf = max(shelf, h)
+    return width, int(util.upper_power_of_two(max(1, y + shelf))), positions
+
+
+class Atlas(object):
+    """Small images packed into one texture, each padded with copies of its
+    edge texels so filtering does not bleed.
+    
+    """
+    def __init__(self, paths, width=ATLAS_WIDTH, padding=ATLAS_PADDING):
+        """Constructor: packs the images (reading only their sizes)."""
+        super(Atlas, self).__init__()
+        self.paths = paths
+        self.padding = padding
+        self.names = [os.path.basename(path).rsplit('.', 1)[0]
+                      for path in paths]
+        self.sizes = [Image.open(path).size for path in paths]
+        (self.width, self.height, self.positions) = pack(self.sizes, width,
+                padding)
+        self.regions = {}
+        for (name, (w, h), (x, y)) in zip(self.names, self.sizes,
+                                          self.positions):
+            self.regions[name] = (float(x) / self.width,
+                    float(y) / self.height, float(x + w) / self.width,
+                    float(y + h) / self.height)
+    
+    def load(self):
+        """Return (format, levels, key) of the atlas's pixels, cached under a
+        digest of the images and their layout.
+        
+        """
+        sha = hashlib.sha1(repr((self.width, self.height, self.padding,
+                self.positions)))
+        for path in self.paths:
+            sha.update(cache.digest(path))
+        (format, levels, key) = cached_mipmaps('atlas', sha.hexdigest(),
+                self.compose)
+        last = int(math.log(self.padding, 2))
+        return format, levels[0:last + 1], key
+    
+    def compose(self):
+        """Return ('RGB', pixels) of the packed images."""
+        pixels = numpy.zeros((self.height, self.width, 3), numpy.uint8)
+        for (path, (w, h), (x, y)) in zip(self.paths, self.sizes,
+                                          self.positions):
+            image = load_image(path)[2]
+            if image.ndim == 2:
+                image = numpy.dstack([image] * 3) #grayscale
+            padded = numpy.pad(image[:, :, 0:3], ((self.padding,) * 2,
+                    (self.padding,) * 2, (0, 0)), 'edge')
+            pixels[y - self.padding:y + h + self.padding,
+                   x - self.padding:x + w + self.padding] = padded
+        return 'RGB', pixels
+
+
+def init(streaming=False):
+    """Load textures into the dictionary and cube map, packing the small ones
+    into an atlas.
+    
+    """
+    global stream
+    print '%s> loading 2D textures%s:' % (__name__,
+            ' (streaming)' if streaming else '')
+    if streaming:
+        stream = TextureStream()
+    for file in ['earth.png']:
         name = file.rsplit('.', 1)[0]
         print ' ', name
-        textures[name] = load_2D_texture(os.path.join(TEXTURE_PATH, file))
+        load = functools.partial(load_mipmaps, os.path.join(TEXTURE_PATH,
+                file))
+        if stream is not None:
+            textures[name] = stream.load(name, load)
+        else:
+            textures[name] = create_2D_texture(name, *load())
+    
+    print '%s> packing 2D texture atlas:' % __name__
+    paths = []
+    for file in ATLAS_FILES:
+        path = os.path.join(TEXTURE_PATH, file)
+        if os.path.isfile(path):
+            print ' ', file.rsplit('.', 1)[0]
+            paths.append(path)
+        else:
+            print >> sys.stderr, 'init> missing texture: %s' % file
+    atlas = Atlas(paths)
+    if stream is not None:
+        texture = stream.load('atlas', atlas.load)
+    else:
+        texture = create_2D_texture('atlas', *atlas.load())
+    for name in atlas.names:
+        textures[name] = texture
+        regions[name] = atlas.regions[name]
     
     print '%s> loading cube map textures:' % __name__
     load_cube_textures()
+
+
+def update():
+    """Stream in the next part of the 2D textures (once per frame), if init()
+    was asked to stream them.
+    
+    """
+    if stream is not None and stream.busy():
+        stream.update()
@@ -0,0 +1,5 @@
+"""Puts src on the path, as running from src does."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
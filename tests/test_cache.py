@@ -0,0 +1,64 @@
+"""Tests of cache: writing, reading back and pruning entries."""
+import os
+
+import numpy
+
+import cache
+
+def make_entry(tmpdir, name='ship', key='0123456789abcdef'):
+    """Write an entry of two arrays (and an empty one) and return its path."""
+    path = os.path.join(str(tmpdir), 'models', '%s.%s.bin' % (name, key))
+    cache.write(path, {
+        'vertices': numpy.arange(12, dtype=numpy.float32).reshape(4, 3),
+        'indices': numpy.array([[0, 1, 2], [0, 2, 3]], numpy.int32),
+        'empty': numpy.zeros((0, 3), numpy.float32)
+    }, {'version': 5, 'source': 'ship.obj'})
+    return path
+
+def test_round_trip(tmpdir):
+    path = make_entry(tmpdir)
+    (header, arrays) = cache.read(path)
+    assert header == {'version': 5, 'source': 'ship.obj'}
+    assert sorted(arrays.keys()) == ['empty', 'indices', 'vertices']
+    assert isinstance(arrays['vertices'], numpy.memmap)
+    assert arrays['vertices'].dtype == numpy.float32
+    assert arrays['vertices'].tolist() == numpy.arange(12).reshape(4, 3).tolist()
+    assert arrays['indices'].tolist() == [[0, 1, 2], [0, 2, 3]]
+    assert arrays['empty'].shape == (0, 3)
+    assert cache.read_header(path) == header
+    assert not [name for name in os.listdir(os.path.dirname(path))
+                if name.endswith('.tmp')]
+
+def test_missing(tmpdir):
+    path = os.path.join(str(tmpdir), 'ship.0123456789abcdef.bin')
+    assert cache.read(path) is None
+    assert cache.read_header(path) is None
+
+def test_prune(tmpdir):
+    stale = make_entry(tmpdir, key='aaaaaaaaaaaaaaaa')
+    other = make_entry(tmpdir, name='rock', key='aaaaaaaaaaaaaaaa')
+    path = make_entry(tmpdir, key='bbbbbbbbbbbbbbbb')
+    assert not os.path.exists(stale)
+    assert os.path.exists(other)
+    assert os.path.exists(path)
+
+def test_truncated(tmpdir):
+    path = make_entry(tmpdir)
+    size = os.path.getsize(path) #the last array's 48 bytes, padded to 64
+    with open(path, 'r+b') as file:
+        file.truncate(size - 32)
+    assert cache.read(path) is None
+    assert cache.read_header(path) is None
+    with open(path, 'r+b') as file:
+        file.truncate(len(cache.MAGIC) + 2)
+    assert cache.read(path) is None
+
+def test_corrupt(tmpdir):
+    path = make_entry(tmpdir)
+    with open(path, 'r+b') as file:
+        file.seek(len(cache.MAGIC) + 4)
+        file.write('{garbled')
+    assert cache.read(path) is None
+    with open(path, 'r+b') as file:
+        file.write('NOTCACHE')
+    assert cache.read(path) is None
@@ -0,0 +1,43 @@
+"""Tests of cascades: splitting the view frustum and fitting light views."""
+import math
+
+import numpy
+
+import cascades
+
+def test_even_splits():
+    assert numpy.allclose(cascades.splits(1.0, 101.0, 4, blend=0),
+                          [26, 51, 76, 101])
+
+def test_logarithmic_splits():
+    assert numpy.allclose(cascades.splits(1.0, 1000.0, 3, blend=1),
+                          [10, 100, 1000])
+
+def test_blended_splits():
+    (near, far) = (0.5, 2000.0)
+    blended = cascades.splits(near, far, 4)
+    even = cascades.splits(near, far, 4, blend=0)
+    logarithmic = cascades.splits(near, far, 4, blend=1)
+    assert len(blended) == 4
+    assert numpy.isclose(blended[-1], far)
+    assert (numpy.diff(numpy.concatenate(([near], blended))) > 0).all()
+    assert numpy.allclose(blended, cascades.BLEND * logarithmic +
+            (1 - cascades.BLEND) * even)
+    assert (logarithmic[:-1] < blended[:-1]).all()
+    assert (blended[:-1] < even[:-1]).all()
+
+def test_single_split():
+    assert numpy.allclose(cascades.splits(1.0, 50.0, 1), [50])
+
+def test_slice_sphere():
+    (camera, center, up) = ((0, 0, 0), (0, 10, 0), (0, 0, 1))
+    (middle, radius) = cascades.slice_sphere(camera, center, up, 90.0, 2.0,
+            10.0, 20.0)
+    #the far corners: 20 along y, +/-40 along x (aspect 2) and +/-20 along z
+    for x in (-40, 40):
+        for z in (-20, 20):
+            distance = numpy.sqrt(((numpy.array([x, 20, z]) - middle) **
+                    2).sum())
+            assert distance <= radius + 1e-9
+    assert numpy.allclose(middle, [0, 15, 0])
+    assert math.fabs(radius - math.sqrt(40 ** 2 + 5 ** 2 + 20 ** 2)) < 1e-9
@@ -0,0 +1,133 @@
+"""Tests of models: .obj parsing, its arrays and mesh optimization."""
+import numpy
+
+from objects import models
+
+def load(tmpdir, text):
+    """Return an OBJLoader initialized with a .obj file of text."""
+    path = tmpdir.join('test.obj')
+    path.write(text)
+    loader = models.OBJLoader()
+    loader.init(str(path))
+    return loader
+
+SQUARE = """v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+vt 0 0
+vn 0 0 2
+"""
+
+def test_mixed_layouts(tmpdir):
+    loader = load(tmpdir, SQUARE + """f 1 2 3
+f 1/1 3/1 4/1
+f 1//1 2//1 3//1 4//1
+f 1/1/1 3/1/1 4/1/1
+""")
+    assert loader.vertexIndices.tolist() == [[0, 1, 2], [0, 2, 3], [0, 1, 2],
+            [0, 2, 3], [0, 2, 3]]
+    assert loader.normalIndices.tolist() == [[-1, -1, -1], [-1, -1, -1],
+            [0, 0, 0], [0, 0, 0], [0, 0, 0]]
+    assert numpy.allclose(loader.normals, [[0, 0, 1]])
+
+def test_single_layout(tmpdir):
+    loader = load(tmpdir, SQUARE + 'f 1/1/1 2/1/1 3/1/1 4/1/1\n')
+    assert loader.vertexIndices.tolist() == [[0, 1, 2], [0, 2, 3]]
+    assert loader.normalIndices.tolist() == [[0, 0, 0], [0, 0, 0]]
+
+def test_negative_indices(tmpdir):
+    loader = load(tmpdir, """v 0 0 0
+v 1 0 0
+v 1 1 0
+f -3 -2 -1
+v 0 1 0
+vn 0 0 1
+f -4//-1 -2//-1 -1//-1
+""")
+    assert loader.vertexIndices.tolist() == [[0, 1, 2], [0, 2, 3]]
+    assert loader.normalIndices.tolist() == [[-1, -1, -1], [0, 0, 0]]
+
+def test_chunks(tmpdir, monkeypatch):
+    text = SQUARE + 'usemtl a\nf 1 2 3\nf 1/1 3/1 4/1\nf -4//1 -2//1 -1//1\n'
+    whole = load(tmpdir, text)
+    monkeypatch.setattr(models, 'CHUNK_SIZE', 7)
+    chunked = load(tmpdir, text)
+    assert chunked.vertexIndices.tolist() == whole.vertexIndices.tolist()
+    assert chunked.normalIndices.tolist() == whole.normalIndices.tolist()
+    assert numpy.array_equal(chunked.vertices, whole.vertices)
+    assert [(mesh.first, mesh.count) for mesh in chunked.meshes] == [(0, 3)]
+
+def test_growable_array():
+    rows = models.GrowableArray((3,), numpy.int32)
+    assert len(rows) == 0
+    expected = []
+    for n in xrange(1, 60):
+        block = numpy.arange(3 * n, dtype=numpy.int32).reshape(n, 3) + n
+        rows.append(block)
+        expected.extend(block.tolist())
+    assert len(rows) == len(expected) == 1770
+    assert len(rows.data) >= 1770
+    array = rows.array()
+    assert array.dtype == numpy.int32
+    assert array.shape == (1770, 3)
+    assert array.tolist() == expected
+    #handed over: the array is its own (trimmed) copy, and rows starts over
+    assert len(rows) == 0
+    rows.append(numpy.zeros((2, 3), numpy.int32))
+    assert array.tolist() == expected
+    assert rows.array().shape == (2, 3)
+
+def test_growable_array_empty():
+    array = models.GrowableArray((3,), numpy.float32).array()
+    assert array.shape == (0, 3)
+    assert array.dtype == numpy.float32
+
+def grid(size):
+    """Return the (T, 3) triangles of a size by size grid of quads, in a
+    shuffled order.
+    
+    """
+    corners = numpy.arange((size + 1) ** 2).reshape(size + 1, size + 1)
+    (a, b) = (corners[:-1, :-1].ravel(), corners[:-1, 1:].ravel())
+    (c, d) = (corners[1:, 1:].ravel(), corners[1:, :-1].ravel())
+    triangles = numpy.concatenate((numpy.column_stack((a, b, c)),
+            numpy.column_stack((a, c, d)))).astype(numpy.int32)
+    return triangles[numpy.random.RandomState(0).permutation(len(triangles))]
+
+def test_weld():
+    vertexIndices = numpy.array([[0, 1, 2], [0, 2, 3], [0, 1, 2]], numpy.int32)
+    normalIndices = numpy.array([[0, 0, 0], [0, 0, 0], [1, 1, -1]], numpy.int32)
+    (pairs, triangles) = models.weld(vertexIndices, normalIndices)
+    assert len(pairs) == 7
+    assert pairs[triangles].tolist() == numpy.dstack((vertexIndices,
+            normalIndices)).tolist()
+
+def test_weld_without_normals():
+    vertexIndices = numpy.array([[2, 1, 0], [0, 1, 3]], numpy.int32)
+    normalIndices = numpy.empty_like(vertexIndices)
+    normalIndices.fill(-1)
+    (pairs, triangles) = models.weld(vertexIndices, normalIndices)
+    assert pairs.tolist() == [[0, -1], [1, -1], [2, -1], [3, -1]]
+    assert triangles.tolist() == vertexIndices.tolist()
+
+def test_acmr():
+    strip = numpy.array([[0, 1, 2], [1, 2, 3], [2, 3, 4]])
+    assert models.acmr(strip) == 5.0 / 3
+    quad = numpy.array([[0, 1, 2], [0, 2, 3]])
+    assert models.acmr(quad, cacheSize=3) == 2.0
+    assert models.acmr(quad, cacheSize=2) == 2.5 #0 was pushed out by 2
+    assert models.acmr(numpy.zeros((0, 3), numpy.int32)) == 0.0
+
+def test_optimize_vertex_cache():
+    triangles = grid(32)
+    optimized = models.optimize_vertex_cache(triangles)
+    #the same triangles, each still wound the same way
+    assert sorted(map(tuple, optimized.tolist())) == sorted(map(tuple,
+            triangles.tolist()))
+    assert models.acmr(optimized) < 0.8
+    assert models.acmr(optimized) < models.acmr(triangles) / 2
+
+def test_optimize_vertex_cache_empty():
+    empty = numpy.zeros((0, 3), numpy.int32)
+    assert len(models.optimize_vertex_cache(empty)) == 0
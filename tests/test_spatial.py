@@ -0,0 +1,138 @@
+"""Tests of spatial: the bounding volume hierarchy and its queries."""
+import random
+
+from objects.gl_objects import Bounds
+import spatial
+
+class Thing(object):
+    """A scene object at a box (or without bounds, if lower is None)."""
+    def __init__(self, lower=None, upper=None):
+        """Constructor"""
+        super(Thing, self).__init__()
+        self.place(lower, upper)
+    
+    def place(self, lower, upper):
+        """Move this Thing to the box (lower, upper)."""
+        self.bounds = None if lower is None else Bounds(lower, upper)
+    
+    def scene_bounds(self):
+        """Return the Bounds of this Thing in world space."""
+        return self.bounds
+
+def scatter(count, seed=0):
+    """Return count Things at random boxes."""
+    generator = random.Random(seed)
+    things = []
+    for i in xrange(count):
+        lower = [generator.uniform(-500, 500) for axis in xrange(3)]
+        size = generator.uniform(1, 20)
+        things.append(Thing(lower, [x + size for x in lower]))
+    return things
+
+def check(index):
+    """Assert that every Node holds its children and every leaf its object."""
+    assert index.root is None or index.root.parent is None
+    stack = [index.root] if index.root is not None else []
+    leaves = 0
+    while stack:
+        node = stack.pop()
+        if node.children is None:
+            leaves += 1
+            assert index.leaves[node.object] is node
+            assert spatial.contains(node.lower, node.upper, *node.tight)
+            continue
+        for child in node.children:
+            assert child.parent is node
+            assert spatial.contains(node.lower, node.upper, child.lower,
+                    child.upper)
+            stack.append(child)
+    assert leaves == len(index.leaves)
+
+def inside(thing, lower, upper):
+    """Return whether thing's box overlaps the box (lower, upper)."""
+    bounds = thing.scene_bounds()
+    return spatial.overlaps(bounds.lower, bounds.upper, lower, upper)
+
+def test_build():
+    things = scatter(300)
+    index = spatial.SpatialIndex()
+    index.build(things + [Thing()])
+    check(index)
+    assert len(index) == 301
+    assert all(thing in index for thing in things)
+    (lower, upper) = ((-100, -100, -100), (150, 150, 150))
+    assert (set(index.query_box(lower, upper)) ==
+            set(thing for thing in things if inside(thing, lower, upper)))
+
+def test_insert_remove():
+    things = scatter(300)
+    index = spatial.SpatialIndex()
+    for thing in things:
+        index.insert(thing)
+    check(index)
+    for thing in things[::2]:
+        index.remove(thing)
+    check(index)
+    assert len(index) == 150
+    assert things[0] not in index and things[1] in index
+    found = index.query_sphere((0, 0, 0), 1e6)
+    assert sorted(found) == sorted(things[1::2])
+    for thing in things[1::2]:
+        index.remove(thing)
+    assert index.root is None and len(index) == 0
+
+def test_move():
+    things = scatter(100)
+    index = spatial.SpatialIndex(margin=5.0)
+    index.build(things)
+    thing = things[0]
+    leaf = index.leaves[thing]
+    lower = thing.bounds.lower + 1
+    thing.place(lower, thing.bounds.upper + 1)
+    index.move(thing)
+    assert index.leaves[thing] is leaf #still inside the fattened box
+    assert leaf.tight[0] == tuple(lower.tolist())
+    thing.place((1000, 1000, 1000), (1001, 1001, 1001))
+    index.move(thing)
+    check(index)
+    assert index.leaves[thing] is not leaf
+    assert index.query_box((999, 999, 999), (1002, 1002, 1002)) == [thing]
+
+def test_bound():
+    thing = Thing()
+    index = spatial.SpatialIndex()
+    index.build(scatter(10) + [thing])
+    assert thing in index.unbounded
+    thing.place((0, 0, 0), (1, 1, 1))
+    index.bound()
+    check(index)
+    assert thing in index.leaves and not index.unbounded
+
+def test_query_frustum():
+    things = scatter(300)
+    unbounded = Thing()
+    index = spatial.SpatialIndex()
+    index.build(things + [unbounded])
+    #the box [-200, 200] x [-100, 100] x [0, 300], as inward facing planes
+    planes = [(1, 0, 0, 200), (-1, 0, 0, 200), (0, 1, 0, 100),
+              (0, -1, 0, 100), (0, 0, 1, 0), (0, 0, -1, 300)]
+    found = index.query_frustum(planes)
+    assert unbounded in found
+    assert len(found) == len(set(found))
+    assert (set(found) - set([unbounded]) ==
+            set(thing for thing in things if
+                inside(thing, (-200, -100, 0), (200, 100, 300))))
+
+def test_query_ray():
+    things = [Thing((x, -1, -1), (x + 2, 1, 1)) for x in (30, 10, 50, 20)]
+    things.append(Thing((15, 5, -1), (17, 7, 1))) #off the ray
+    index = spatial.SpatialIndex()
+    index.build(things)
+    hits = index.query_ray((0, 0, 0), (2, 0, 0))
+    assert [distance for (distance, thing) in hits] == [10, 20, 30, 50]
+    assert [thing for (distance, thing) in hits] == [things[1], things[3],
+            things[0], things[2]]
+    assert len(index.query_ray((0, 0, 0), (1, 0, 0), 25)) == 2
+    assert index.query_ray((0, 0, 0), (-1, 0, 0)) == []
+    assert index.query_ray((0, 0, 0), (0, 0, 0)) == []
+    assert index.query_ray((11, 0, 0), (0, 1, 0)) == [(0.0, things[1])]